@@ -1,17 +1,93 @@
+import time
+# Taken before the heavy imports so a process's first run includes their cost
+_RERUN_STARTED = time.perf_counter()
+
 import streamlit as st
 from supabase import create_client, Client
 import requests
 import pandas as pd
-import time
+import json
+import os
+import copy
+import functools
+import threading
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from player_summary import (
+    apply_streaks, empty_summary, fold_summary, is_folded, is_in_order, match_sides, unfold_summary
+)
 
 # --- Configuration & Setup ---
 st.set_page_config(page_title=":Defying 내전 관리", layout="wide")
 
+# --- PERFORMANCE MEASUREMENT ---
+@st.cache_resource(show_spinner=False)
+def get_process_stats():
+    """Process-wide counters shared by every session (cold start time, rerun count)."""
+    return {"cold_start_ms": None, "reruns": 0}
+
+# The process's first script run is its cold start, whichever session it serves. It is claimed
+# here at the start (setdefault is atomic), so a later warm run is never recorded in its place.
+_RUN_TOKEN = object()
+_IS_COLD_RUN = get_process_stats().setdefault("cold_run", _RUN_TOKEN) is _RUN_TOKEN
+
+def record_run_timing():
+    """Records this run's total time. Call at every point the script ends (end of file, before st.stop())."""
+    rerun_ms = (time.perf_counter() - _RERUN_STARTED) * 1000
+    process_stats = get_process_stats()
+    process_stats["reruns"] += 1
+    if _IS_COLD_RUN:
+        process_stats["cold_start_ms"] = rerun_ms
+    st.session_state.last_rerun_ms = rerun_ms
+    st.session_state.last_perf_timings = st.session_state.pop('perf_timings', {})
+
+@contextmanager
+def perf_timer(label):
+    """Records how long the wrapped block took (ms) into this session's perf timings."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        st.session_state.setdefault('perf_timings', {})[label] = (time.perf_counter() - start) * 1000
+
+# --- CACHED RESOURCES ---
+# Clients live once per process instead of being rebuilt on every rerun of every session.
+HEALTH_CHECK_INTERVAL = 60 # seconds between Supabase pings
+
+def _supabase_is_healthy(client):
+    """Validates the cached client; a failed ping makes cache_resource build a fresh one."""
+    now = time.monotonic()
+    if now - client._last_health_check < HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        client.table("maps").select("id").limit(1).execute()
+    except Exception:
+        return False
+    client._last_health_check = now
+    return True
+
+@st.cache_resource(validate=_supabase_is_healthy, show_spinner=False)
+def get_supabase(url, key) -> Client:
+    client = create_client(url, key)
+    client._last_health_check = time.monotonic()
+    return client
+
+@st.cache_resource(show_spinner=False)
+def get_discord_session(token):
+    """Keep-alive HTTP session with the bot Authorization header preset."""
+    session = requests.Session()
+    session.headers.update({"Authorization": f"Bot {token}"})
+    return session
+
 # Initialize Supabase Client
 try:
     SUPABASE_URL = st.secrets["SUPABASE_URL"]
     SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    with perf_timer("Supabase 연결"):
+        supabase = get_supabase(SUPABASE_URL, SUPABASE_KEY)
 except Exception as e:
     st.error("Supabase 설정 오류. secrets.toml 파일을 확인해주세요.")
     st.stop()
@@ -19,12 +95,72 @@ except Exception as e:
 # Discord Config
 try:
     DISCORD_TOKEN_RAW = st.secrets["DISCORD_TOKEN_RAW"]
-    GUILD_ID = st.secrets["GUILD_ID"]
-    DISCORD_HEADER = {"Authorization": f"Bot {DISCORD_TOKEN_RAW}"} 
+    # Several communities: a [GUILDS] table of "name" = "guild id". A single GUILD_ID still works.
+    if "GUILDS" in st.secrets:
+        GUILDS = {name: int(gid) for name, gid in st.secrets["GUILDS"].items()}
+    else:
+        GUILDS = {"기본 서버": int(st.secrets["GUILD_ID"])}
 except Exception as e:
     st.error("Discord 설정 오류. secrets.toml 파일을 확인해주세요.")
     st.stop()
 
+# Active Guild (per session; shared links pin it with ?guild=<id>)
+# Every query below is scoped to GUILD_ID. The script module is rebuilt on each run,
+# so this global never leaks between sessions.
+GUILD_NAMES = {gid: name for name, gid in GUILDS.items()}
+guild_param = st.query_params.get("guild")
+if guild_param and guild_param.isdigit() and int(guild_param) in GUILD_NAMES and 'guild_id' not in st.session_state:
+    st.session_state.guild_id = int(guild_param)
+if st.session_state.get('guild_id') not in GUILD_NAMES:
+    st.session_state.guild_id = next(iter(GUILDS.values()))
+GUILD_ID = st.session_state.guild_id
+
+# --- PER-GUILD CACHES ---
+# Each (guild, cached function) pair gets its own LRU with its own size limit, so a busy guild
+# can only evict its own entries of that function, and a write drops just its own guild's caches.
+@st.cache_resource(show_spinner=False)
+def get_guild_caches():
+    """Process-wide LRUs {(guild_id, function name): OrderedDict of args -> (stored_at, value)},
+    per-guild write generations, and the lock guarding both."""
+    return {"lock": threading.Lock(), "caches": {}, "generations": {}}
+
+def guild_cache(ttl, max_entries):
+    """Caches func(guild_id, *args) in an LRU of its own per guild, keeping at most max_entries.
+
+    Like st.cache_data, each call returns a copy, so callers may mutate the result."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(guild_id, *args):
+            caches = get_guild_caches()
+            cache_key = (guild_id, func.__name__)
+            now = time.monotonic()
+            with caches["lock"]:
+                generation = caches["generations"].get(guild_id, 0)
+                cache = caches["caches"].get(cache_key)
+                hit = cache.get(args) if cache is not None else None
+                if hit and now - hit[0] < ttl:
+                    cache.move_to_end(args)
+                    return copy.deepcopy(hit[1])
+            value = func(guild_id, *args)
+            with caches["lock"]:
+                # A write invalidated the guild while we were reading: our value may be stale, don't keep it
+                if caches["generations"].get(guild_id, 0) == generation:
+                    cache = caches["caches"].setdefault(cache_key, OrderedDict())
+                    cache[args] = (now, value)
+                    cache.move_to_end(args)
+                    while len(cache) > max_entries:
+                        cache.popitem(last=False)
+            return copy.deepcopy(value)
+        return wrapper
+    return decorator
+
+def invalidate_guild_cache(guild_id):
+    caches = get_guild_caches()
+    with caches["lock"]:
+        caches["generations"][guild_id] = caches["generations"].get(guild_id, 0) + 1
+        for cache_key in [k for k in caches["caches"] if k[0] == guild_id]:
+            del caches["caches"][cache_key]
+
 # --- RANK DEFINITIONS ---
 # Priority Order (High index = Higher Priority for sorting, Low Index for iteration if using reversed)
 # Let's map rank name to an integer priority
@@ -41,6 +177,9 @@ RANK_PRIORITY = {
     "언랭": 1
 }
 
+# Ordered Rank List for Display
+RANK_ORDER = ["레디언트", "불멸", "초월자", "다이아몬드", "플래티넘", "골드", "실버", "브론즈", "아이언", "언랭"]
+
 def get_tier_from_roles(role_names):
     """Determines the highest tier from a list of role names."""
     current_tier = "언랭"
@@ -57,12 +196,13 @@ def get_tier_from_roles(role_names):
 
 # --- Functions ---
 
-def sync_discord_members():
-    """Fetches members and roles from Discord API and updates the Supabase 'users' table."""
+def sync_discord_members(guild_id):
+    """Fetches members and roles of one guild from Discord API and updates its Supabase 'users' rows."""
     
     # 1. Fetch Roles
-    roles_url = f"https://discord.com/api/v10/guilds/{GUILD_ID}/roles"
-    roles_resp = requests.get(roles_url, headers=DISCORD_HEADER)
+    roles_url = f"https://discord.com/api/v10/guilds/{guild_id}/roles"
+    discord = get_discord_session(DISCORD_TOKEN_RAW)
+    roles_resp = discord.get(roles_url)
     
     role_map = {}
     if roles_resp.status_code == 200:
@@ -73,8 +213,8 @@ def sync_discord_members():
         st.warning(f"역할 정보를 가져오지 못했습니다. (Status: {roles_resp.status_code})")
 
     # 2. Fetch Members
-    members_url = f"https://discord.com/api/v10/guilds/{GUILD_ID}/members?limit=1000"
-    response = requests.get(members_url, headers=DISCORD_HEADER)
+    members_url = f"https://discord.com/api/v10/guilds/{guild_id}/members?limit=1000"
+    response = discord.get(members_url)
     
     if response.status_code == 200:
         members = response.json()
@@ -105,6 +245,7 @@ def sync_discord_members():
                 tier = get_tier_from_roles(role_names)
                 
                 users_data.append({
+                    "guild_id": guild_id,
                     "id": user_id,
                     "name": username,
                     "display_name": display_name,
@@ -124,12 +265,23 @@ def sync_discord_members():
         # Remove Bots from DB if they exist
         if bot_ids:
             try:
-                supabase.table("users").delete().in_("id", bot_ids).execute()
+                supabase.table("users").delete().eq("guild_id", guild_id).in_("id", bot_ids).execute()
             except Exception as e:
                 # Log error but don't fail the whole sync? Or maybe we should.
                 # For now let's just proceed.
                 print(f"Failed to remove bots: {e}")
 
+        try:
+            append_event("member_synced", {
+                "members": [{"id": u['id'], "tier": u['tier']} for u in users_data],
+                "bots_removed": bot_ids
+            }, guild_id=guild_id)
+        except Exception as e:
+            print(f"Failed to log sync event: {e}")
+
+        invalidate_guild_cache(guild_id)
+        publish_leaderboard_snapshot(guild_id)
+
         if upsert_count > 0 or bot_ids:
              return upsert_count, f"성공적으로 동기화되었습니다. (봇 {len(bot_ids)}명 제외)"
         else:
@@ -140,32 +292,550 @@ def sync_discord_members():
 
 def get_all_users():
     """Retrieves all users from Supabase."""
-    response = supabase.table("users").select("*").execute()
+    response = supabase.table("users").select("*").eq("guild_id", GUILD_ID).execute()
     return response.data
 
+def build_user_frame(users):
+    """Builds the leaderboard DataFrame (with win_rate) from user rows."""
+    df = pd.DataFrame(users)
+    games = df['total_games'].where(df['total_games'] > 0)
+    df['win_rate'] = (df['wins'] / games * 100).fillna(0.0)
+    return df
+
 # Helper for Map Management
 def add_map(map_name):
     try:
-        supabase.table("maps").insert({"name": map_name}).execute()
+        supabase.table("maps").insert({"guild_id": GUILD_ID, "name": map_name}).execute()
+        append_event("map_changed", {"action": "added", "name": map_name})
         return True, "맵이 추가되었습니다."
     except Exception as e:
         return False, str(e)
 
 def delete_map(map_id):
     try:
-        supabase.table("maps").delete().eq("id", map_id).execute()
+        res = supabase.table("maps").delete().eq("guild_id", GUILD_ID).eq("id", map_id).execute()
+        removed = res.data[0]['name'] if res.data else None
+        append_event("map_changed", {"action": "deleted", "map_id": map_id, "name": removed})
         return True, "맵이 삭제되었습니다."
     except Exception as e:
         return False, str(e)
 
 def get_all_maps():
     try:
-        res = supabase.table("maps").select("*").order("name").execute()
+        res = supabase.table("maps").select("*").eq("guild_id", GUILD_ID).order("name").execute()
+        return res.data
+    except:
+        return []
+
+# --- SEASONS & ROLLUPS ---
+# Leaderboard windows are served from rollup tables (user_daily_stats, user_season_stats)
+# that record_match / delete_match keep up to date, so switching windows never rescans match_participants.
+RECENT_DAYS = 30
+
+@guild_cache(ttl=300, max_entries=16)
+def _get_all_seasons(guild_id):
+    try:
+        res = supabase.table("seasons").select("*").eq("guild_id", guild_id).order("started_at", desc=True).execute()
         return res.data
     except:
         return []
 
-def record_match(team_a_ids, team_b_ids, winning_team, map_name):
+def get_all_seasons():
+    """Retrieves the active guild's seasons, newest first."""
+    return _get_all_seasons(GUILD_ID)
+
+def get_current_season(guild_id=None):
+    """Returns the guild's running season (ended_at is NULL), or None."""
+    try:
+        res = supabase.table("seasons").select("*").eq("guild_id", guild_id or GUILD_ID).is_("ended_at", "null").order("started_at", desc=True).limit(1).execute()
+        return res.data[0] if res.data else None
+    except:
+        return None
+
+def start_new_season(season_name):
+    """Closes the running season and opens a new one."""
+    try:
+        now = datetime.now(timezone.utc).isoformat()
+        supabase.table("seasons").update({"ended_at": now}).eq("guild_id", GUILD_ID).is_("ended_at", "null").execute()
+        supabase.table("seasons").insert({"guild_id": GUILD_ID, "name": season_name, "started_at": now}).execute()
+        invalidate_guild_cache(GUILD_ID)
+        publish_leaderboard_snapshot()
+        return True, f"'{season_name}' 시즌이 시작되었습니다."
+    except Exception as e:
+        return False, str(e)
+
+def build_stat_deltas(participants, winning_team, sign=1):
+    """Maps user_id -> (wins, total_games) increments for one match. Use sign=-1 to revert."""
+    deltas = {}
+    for p in participants:
+        won = 1 if p['team'] == winning_team else 0
+        deltas[p['user_id']] = (sign * won, sign)
+    return deltas
+
+def apply_stat_deltas(match, deltas):
+    """Adds (wins, total_games) deltas to the lifetime stats on users and to the daily and season
+    rollups of `match`, in one atomic RPC. Returns user ids whose counts went negative.
+
+    Values are never clamped: a negative count means the projection drifted from the ledger."""
+    if not deltas:
+        return []
+    res = supabase.rpc("apply_stat_deltas", {
+        "p_guild_id": GUILD_ID,
+        "p_day": match['created_at'][:10],
+        "p_season_id": match.get('season_id'),
+        "p_deltas": [{"user_id": uid, "wins": wins, "total_games": total} for uid, (wins, total) in deltas.items()]
+    }).execute()
+    invalidate_guild_cache(GUILD_ID)
+    return [r['user_id'] for r in res.data]
+
+@guild_cache(ttl=300, max_entries=64)
+def _get_window_stats(guild_id, kind, param):
+    if kind == "season":
+        rows = supabase.table("user_season_stats").select("user_id, wins, total_games").eq("guild_id", guild_id).eq("season_id", param).execute().data
+    elif kind == "days":
+        since = (datetime.now(timezone.utc).date() - timedelta(days=param - 1)).isoformat()
+        rows = supabase.table("user_daily_stats").select("user_id, wins, total_games").eq("guild_id", guild_id).gte("day", since).execute().data
+    elif kind == "recent":
+        rows = supabase.rpc("recent_form", {"match_limit": param, "p_guild_id": guild_id}).execute().data
+    elif kind == "as_of":
+        return get_ledger_state(as_of=param, guild_id=guild_id)
+    else:
+        rows = []
+
+    stats = {}
+    for r in rows:
+        wins, total = stats.get(r['user_id'], (0, 0))
+        stats[r['user_id']] = (wins + r['wins'], total + r['total_games'])
+    return stats
+
+def get_window_stats(kind, param):
+    """Returns {user_id: (wins, total_games)} for a leaderboard window of the active guild.
+
+    kind: 'season' (param = season id), 'days' (param = number of days), 'recent' (param = last N matches
+    per player) or 'as_of' (param = ISO timestamp, replayed from the ledger).
+    """
+    return _get_window_stats(GUILD_ID, kind, param)
+
+# --- MATCH LEDGER ---
+# ledger_events is append-only and is the source of truth for stats. users.wins/total_games
+# and the rollups are projections of it. Current (or point-in-time) stats are the latest
+# snapshot plus a replay of at most SNAPSHOT_INTERVAL later events, so recovery time
+# stays bounded as history grows.
+STAT_EVENTS = ["match_recorded", "match_voided"]
+SNAPSHOT_INTERVAL = 50 # ledger events between stats snapshots
+
+def append_event(event_type, payload, match_id=None, guild_id=None):
+    """Appends one event to the guild's ledger. Match events are written by the record_match /
+    void_match RPCs instead, together with the rows they describe."""
+    res = supabase.table("ledger_events").insert({
+        "guild_id": guild_id or GUILD_ID,
+        "event_type": event_type,
+        "match_id": match_id,
+        "payload": payload
+    }).execute()
+    return res.data[0]
+
+def snapshot_if_due(guild_id=None):
+    """Snapshots stats once SNAPSHOT_INTERVAL stat events have accumulated since the last snapshot.
+
+    Best effort: snapshots only bound replay time, so a failure is logged and never fails the
+    write that triggered it (the next match retries)."""
+    guild_id = guild_id or GUILD_ID
+    try:
+        # Event ids are shared by all guilds, so count this guild's own stat events since its last snapshot
+        latest = get_latest_snapshot(guild_id=guild_id)
+        since = (
+            supabase.table("ledger_events").select("id", count="exact")
+            .eq("guild_id", guild_id)
+            .in_("event_type", STAT_EVENTS)
+            .gt("id", latest['last_event_id'] if latest else 0)
+            .limit(1)
+            .execute()
+        )
+        if since.count >= SNAPSHOT_INTERVAL:
+            take_snapshot(guild_id)
+    except Exception as e:
+        print(f"Failed to take ledger snapshot: {e}")
+
+def get_latest_snapshot(as_of=None, guild_id=None):
+    """Newest snapshot whose folded events all happened at or before `as_of` (ISO timestamp)."""
+    query = supabase.table("ledger_snapshots").select("*").eq("guild_id", guild_id or GUILD_ID)
+    if as_of:
+        query = query.lte("event_time", as_of)
+    res = query.order("last_event_id", desc=True).limit(1).execute()
+    return res.data[0] if res.data else None
+
+def fetch_events(after_id=0, until=None, event_types=None, page_size=1000, guild_id=None):
+    """The guild's ledger events with id > after_id (and created_at <= until), oldest first."""
+    events = []
+    while True:
+        query = supabase.table("ledger_events").select("*").eq("guild_id", guild_id or GUILD_ID).gt("id", after_id)
+        if until:
+            query = query.lte("created_at", until)
+        if event_types:
+            query = query.in_("event_type", event_types)
+        page = query.order("id").limit(page_size).execute().data
+        events.extend(page)
+        if len(page) < page_size:
+            return events
+        after_id = page[-1]['id']
+
+def replay(stats, events):
+    """Folds stat events into {user_id: (wins, total_games)}."""
+    for e in events:
+        if e['event_type'] not in STAT_EVENTS:
+            continue
+        payload = e['payload']
+        sign = 1 if e['event_type'] == "match_recorded" else -1
+        for uid, (d_wins, d_total) in build_stat_deltas(payload['participants'], payload['winning_team'], sign).items():
+            wins, total = stats.get(uid, (0, 0))
+            stats[uid] = (wins + d_wins, total + d_total)
+    return stats
+
+def _fold_ledger(as_of=None, guild_id=None):
+    """Returns (stats, last folded event) from the latest snapshot plus the tail after it."""
+    snapshot = get_latest_snapshot(as_of, guild_id=guild_id)
+    stats, last_event = {}, None
+    after_id = 0
+    if snapshot:
+        stats = {int(uid): tuple(v) for uid, v in snapshot['stats'].items()}
+        after_id = snapshot['last_event_id']
+        last_event = {"id": after_id, "created_at": snapshot['event_time']}
+    tail = fetch_events(after_id=after_id, until=as_of, event_types=STAT_EVENTS, guild_id=guild_id)
+    if tail:
+        last_event = tail[-1]
+    return replay(stats, tail), last_event
+
+def get_ledger_state(as_of=None, guild_id=None):
+    """Returns {user_id: (wins, total_games)} as of now, or as of an ISO timestamp."""
+    stats, _ = _fold_ledger(as_of, guild_id=guild_id)
+    return stats
+
+def take_snapshot(guild_id=None):
+    guild_id = guild_id or GUILD_ID
+    stats, last_event = _fold_ledger(guild_id=guild_id)
+    if last_event:
+        supabase.table("ledger_snapshots").insert({
+            "guild_id": guild_id,
+            "last_event_id": last_event['id'],
+            "event_time": last_event['created_at'],
+            "stats": {str(uid): list(v) for uid, v in stats.items()}
+        }).execute()
+
+def rebuild_rollups():
+    """Recomputes the guild's daily and season rollups from every match event in the ledger.
+
+    Unlike the lifetime stats this is a full replay (snapshots only hold lifetime totals),
+    which is acceptable for an explicit repair action."""
+    daily, season = {}, {}
+    for e in fetch_events(event_types=STAT_EVENTS):
+        payload = e['payload']
+        sign = 1 if e['event_type'] == "match_recorded" else -1
+        day = (payload.get('match_created_at') or e['created_at'])[:10]
+        for uid, (d_wins, d_total) in build_stat_deltas(payload['participants'], payload['winning_team'], sign).items():
+            keys = [(daily, ("day", day))]
+            if payload.get('season_id'):
+                keys.append((season, ("season_id", payload['season_id'])))
+            for table, key in keys:
+                wins, total = table.get((key, uid), (0, 0))
+                table[(key, uid)] = (wins + d_wins, total + d_total)
+    
+    for table_name, table in (("user_daily_stats", daily), ("user_season_stats", season)):
+        supabase.table(table_name).delete().eq("guild_id", GUILD_ID).execute()
+        rows = [
+            {"guild_id": GUILD_ID, col: val, "user_id": uid, "wins": wins, "total_games": total}
+            for ((col, val), uid), (wins, total) in table.items() if total != 0 or wins != 0
+        ]
+        for i in range(0, len(rows), 1000):
+            supabase.table(table_name).insert(rows[i:i + 1000]).execute()
+
+def rebuild_user_stats():
+    """Recovers every stat projection (users.wins/total_games, the daily/season rollups and the
+    player summaries) from the ledger and match history."""
+    try:
+        rebuild_rollups()
+        stats = get_ledger_state()
+        users_res = supabase.table("users").select("id").eq("guild_id", GUILD_ID).execute()
+        rows = []
+        for u in users_res.data:
+            wins, total = stats.get(u['id'], (0, 0))
+            rows.append({"guild_id": GUILD_ID, "id": u['id'], "wins": wins, "total_games": total})
+        if rows:
+            supabase.table("users").upsert(rows).execute()
+        supabase.rpc("rebuild_player_summaries", {"p_guild_id": GUILD_ID}).execute()
+        reset_win_model()
+        invalidate_guild_cache(GUILD_ID)
+        publish_leaderboard_snapshot()
+        return True, f"{len(rows)}명의 통계를 원장(ledger)에서 재구성했습니다."
+    except Exception as e:
+        return False, str(e)
+
+def get_recent_events(limit=30):
+    """Most recent ledger events, newest first (audit trail)."""
+    try:
+        res = supabase.table("ledger_events").select("*").eq("guild_id", GUILD_ID).order("id", desc=True).limit(limit).execute()
+        return res.data
+    except:
+        return []
+
+DRIFT_WARNING = " ⚠️ 통계 불일치가 감지되었습니다. 사이드바에서 '통계 재구성'을 실행해주세요."
+
+# --- PUBLIC LEADERBOARD SNAPSHOT ---
+# Read-only viewers (?view=leaderboard) are served from a versioned JSON file that is
+# regenerated only when stats change (record / void / sync / rebuild / new season).
+# A viewer costs one os.stat plus a cached file read; no database query per viewer.
+SNAPSHOT_DIR = Path(__file__).parent / ".cache"
+SNAPSHOT_COLUMNS = ["display_name", "tier", "wins", "total_games", "win_rate"]
+
+def _leaderboard_rows(stats, users_by_id):
+    """Compact, pre-sorted rows (lists in SNAPSHOT_COLUMNS order) for users with stats."""
+    rows = []
+    for uid, (wins, total) in stats.items():
+        user = users_by_id.get(uid)
+        if user is None:
+            continue
+        win_rate = round(wins / total * 100, 1) if total > 0 else 0.0
+        rows.append([user['display_name'], user.get('tier', '-'), wins, total, win_rate])
+    rows.sort(key=lambda r: (r[4], r[2]), reverse=True)
+    return rows
+
+def snapshot_path(guild_id):
+    return SNAPSHOT_DIR / f"leaderboard_{guild_id}.json"
+
+def publish_leaderboard_snapshot(guild_id=None):
+    """Rebuilds the guild's public snapshot from the database and swaps it in atomically."""
+    guild_id = guild_id or GUILD_ID
+    try:
+        users = supabase.table("users").select("id, display_name, tier, wins, total_games").eq("guild_id", guild_id).execute().data
+        users_by_id = {u['id']: u for u in users}
+        generated_at = datetime.now(timezone.utc)
+        snapshot = {
+            "guild": GUILD_NAMES.get(guild_id),
+            "generated_at": generated_at.isoformat(),
+            # Changes on every publish, including season starts and stat rebuilds that add no ledger event
+            "version": int(generated_at.timestamp() * 1000),
+            "columns": SNAPSHOT_COLUMNS,
+            "lifetime": _leaderboard_rows({u['id']: (u['wins'], u['total_games']) for u in users}, users_by_id),
+            "season": None
+        }
+        
+        season = get_current_season(guild_id)
+        if season:
+            season_rows = supabase.table("user_season_stats").select("user_id, wins, total_games").eq("guild_id", guild_id).eq("season_id", season['id']).execute().data
+            season_stats = {r['user_id']: (r['wins'], r['total_games']) for r in season_rows if r['total_games'] > 0}
+            snapshot["season"] = {"name": season['name'], "rows": _leaderboard_rows(season_stats, users_by_id)}
+        
+        # Each writer gets its own temp file, so concurrent publishes never swap in a half-written one
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=SNAPSHOT_DIR, suffix=".tmp", delete=False) as tmp:
+            json.dump(snapshot, tmp, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp.name, snapshot_path(guild_id))
+        return True
+    except Exception as e:
+        print(f"Failed to publish leaderboard snapshot: {e}")
+        return False
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _read_leaderboard_snapshot(path, mtime_ns):
+    # mtime_ns is part of the cache key: a republished file is read once, then served from memory
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot_locks():
+    """Process-wide {guild_id: Lock}, so a missing snapshot is generated by one viewer, not all of them."""
+    return {"lock": threading.Lock(), "guilds": {}}
+
+def load_leaderboard_snapshot():
+    """Returns the active guild's public snapshot, generating it once if it doesn't exist yet."""
+    path = snapshot_path(GUILD_ID)
+    if not path.exists():
+        # .cache/ is empty after a restart; the first viewer publishes while the rest wait, then read its file
+        locks = get_snapshot_locks()
+        with locks["lock"]:
+            guild_lock = locks["guilds"].setdefault(GUILD_ID, threading.Lock())
+        with guild_lock:
+            if not path.exists():
+                publish_leaderboard_snapshot()
+    try:
+        return _read_leaderboard_snapshot(str(path), path.stat().st_mtime_ns)
+    except (OSError, ValueError):
+        # Missing or unreadable snapshot: show "unavailable" instead of crashing every viewer
+        return None
+
+def render_public_leaderboard():
+    """Read-only leaderboard for shared links. Needs no session state and no DB access."""
+    snapshot = load_leaderboard_snapshot()
+    st.title(f"🏆 {(snapshot or {}).get('guild') or ':Defying'} 내전 순위표")
+    if not snapshot:
+        st.info("순위표를 불러올 수 없습니다.")
+        return
+    
+    views = {"전체 기간": snapshot["lifetime"]}
+    if snapshot.get("season"):
+        views[f"🏁 {snapshot['season']['name']}"] = snapshot["season"]["rows"]
+    view_label = st.radio("기간", list(views.keys()), horizontal=True, label_visibility="collapsed")
+    
+    rows = views[view_label]
+    columns = snapshot["columns"]
+    st.dataframe(
+        {col: [r[i] for r in rows] for i, col in enumerate(columns)},
+        column_config={
+            "display_name": "플레이어",
+            "tier": "티어",
+            "wins": "승리",
+            "total_games": "전체 게임",
+            "win_rate": st.column_config.NumberColumn("승률 (%)", format="%.1f %%")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption(f"업데이트: {snapshot['generated_at'][:16].replace('T', ' ')} (UTC)")
+
+# --- PLAYER PROFILES ---
+# A profile is one player_summaries row (updated in O(1) per recorded match) plus one
+# keyset-paginated page of the (guild_id, user_id, match_id) index on match_participants,
+# so it loads in constant time however many matches the player has.
+PROFILE_PAGE_SIZE = 10
+
+def _refresh_streaks(summaries):
+    """Recomputes the streak fields of `summaries` from match history (one RPC for all of them)."""
+    if not summaries:
+        return
+    res = supabase.rpc("player_streaks", {"p_guild_id": GUILD_ID, "p_user_ids": [s['user_id'] for s in summaries]}).execute()
+    by_user = {r['user_id']: r for r in res.data}
+    for summary in summaries:
+        apply_streaks(summary, by_user.get(summary['user_id']))
+
+def update_player_summaries(match_id, map_name, participants, winning_team):
+    """Folds a newly recorded match into each participant's summary (one read, one upsert)."""
+    user_ids = [p['user_id'] for p in participants]
+    res = supabase.table("player_summaries").select("*").eq("guild_id", GUILD_ID).in_("user_id", user_ids).execute()
+    current = {r['user_id']: r for r in res.data}
+    
+    rows, out_of_order = [], []
+    for uid in user_ids:
+        # Existing history is backfilled by schema.sql, so a missing summary is a first match
+        summary = current.get(uid) or empty_summary(GUILD_ID, uid)
+        if is_folded(summary, match_id):
+            continue
+        if not is_in_order(summary, match_id):
+            out_of_order.append(summary) # a newer match was folded first: counts still add up, streaks don't
+        team, teammates, opponents = match_sides(participants, uid)
+        fold_summary(summary, match_id, map_name, team == winning_team, teammates, opponents)
+        summary.pop('updated_at', None)
+        rows.append(summary)
+    _refresh_streaks(out_of_order)
+    if rows:
+        supabase.table("player_summaries").upsert(rows).execute()
+
+def revert_player_summaries(match_id, map_name, participants, winning_team):
+    """Subtracts a voided match from each participant's summary. Call after marking it voided:
+    the streak fields are then recomputed from the remaining history."""
+    res = supabase.table("player_summaries").select("*").eq("guild_id", GUILD_ID).in_("user_id", [p['user_id'] for p in participants]).execute()
+    
+    for summary in res.data:
+        team, teammates, opponents = match_sides(participants, summary['user_id'])
+        unfold_summary(summary, match_id, map_name, team == winning_team, teammates, opponents)
+        summary.pop('updated_at', None)
+    _refresh_streaks(res.data)
+    if res.data:
+        supabase.table("player_summaries").upsert(res.data).execute()
+
+def fetch_player_timeline(user_id, before_id=None, page_size=PROFILE_PAGE_SIZE, guild_id=None):
+    """One page of a player's matches, newest first (keyset pagination on match_id)."""
+    query = (
+        supabase.table("match_participants")
+        .select("match_id, team, matches!inner(created_at, winning_team, map_name)")
+        .eq("guild_id", guild_id or GUILD_ID)
+        .eq("user_id", user_id)
+        .is_("matches.voided_at", "null")
+    )
+    if before_id:
+        query = query.lt("match_id", before_id)
+    return query.order("match_id", desc=True).limit(page_size).execute().data
+
+@guild_cache(ttl=300, max_entries=64)
+def _get_player_profile(guild_id, user_id, before_id):
+    res = supabase.table("player_summaries").select("*").eq("guild_id", guild_id).eq("user_id", user_id).execute()
+    summary = res.data[0] if res.data else empty_summary(guild_id, user_id)
+    
+    # One extra row tells whether an older page exists
+    page = fetch_player_timeline(user_id, before_id, page_size=PROFILE_PAGE_SIZE + 1, guild_id=guild_id)
+    has_more = len(page) > PROFILE_PAGE_SIZE
+    page = page[:PROFILE_PAGE_SIZE]
+    
+    # Teammates / opponents for just this page
+    lineups = {}
+    if page:
+        res = supabase.table("match_participants").select("match_id, user_id, team").eq("guild_id", guild_id).in_("match_id", [m['match_id'] for m in page]).execute()
+        for p in res.data:
+            lineups.setdefault(p['match_id'], []).append(p)
+    return summary, page, lineups, has_more
+
+def get_player_profile(user_id, before_id=None):
+    """Returns (summary, timeline page, {match_id: participants}, has_more) for the active guild."""
+    return _get_player_profile(GUILD_ID, user_id, before_id)
+
+# --- WIN PROBABILITY MODEL ---
+# Trained once per process and guild from the full history (see win_model.py), then
+# taught each new match incrementally by record_match.
+def load_match_history():
+    """All matches, oldest first, with participants. Pages past the PostgREST row limit."""
+    history = []
+    page_size = 1000
+    start = 0
+    while True:
+        res = (
+            supabase.table("matches")
+            .select("id, winning_team, map_name, attack_team, match_participants(user_id, team)")
+            .eq("guild_id", GUILD_ID)
+            .is_("voided_at", "null")
+            .order("id")
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        history.extend(res.data)
+        if len(res.data) < page_size:
+            return history
+        start += page_size
+
+def get_tier_priorities(users):
+    """Maps user_id -> numeric tier (RANK_PRIORITY) for the win model."""
+    return {u['id']: RANK_PRIORITY.get(u.get('tier'), 0) for u in users}
+
+@st.cache_resource(show_spinner=False)
+def get_win_models():
+    """Process-wide registry: {guild_id: WinModel} plus one training lock per guild,
+    so guilds are retrained independently and never twice at once."""
+    return {"lock": threading.Lock(), "models": {}, "locks": {}}
+
+def _win_model_lock(registry, guild_id):
+    with registry["lock"]:
+        return registry["locks"].setdefault(guild_id, threading.Lock())
+
+def get_win_model():
+    """The active guild's model, trained on first use."""
+    registry = get_win_models()
+    model = registry["models"].get(GUILD_ID)
+    if model is not None:
+        return model
+    with _win_model_lock(registry, GUILD_ID):
+        # Another session may have finished training while we waited
+        if GUILD_ID not in registry["models"]:
+            from win_model import WinModel
+            with st.spinner("승률 예측 모델 학습 중..."):
+                users = supabase.table("users").select("id, tier").eq("guild_id", GUILD_ID).execute().data
+                registry["models"][GUILD_ID] = WinModel.train(load_match_history(), get_tier_priorities(users))
+        return registry["models"][GUILD_ID]
+
+def reset_win_model():
+    """Drops the active guild's model; it is retrained on next use."""
+    registry = get_win_models()
+    # Waits for a training in progress, so its (now stale) model can't be stored after the reset
+    with _win_model_lock(registry, GUILD_ID):
+        registry["models"].pop(GUILD_ID, None)
+
+def record_match(team_a_ids, team_b_ids, winning_team, map_name, attack_team=None):
     """Records a match result and updates user stats."""
     # ... (Stats update logic same as before, skipped for brevity but ensure arguments match) ...
     # Wait. I need to replace the WHOLE function if I change the signature.
@@ -174,64 +844,63 @@ def record_match(team_a_ids, team_b_ids, winning_team, map_name):
         return False, "팀 구성원이 부족합니다."
     
     try:
-        # 1. Create Match with Map Name
-        match_data = {
-            "winning_team": winning_team,
-            "map_name": map_name
-        }
-        res = supabase.table("matches").insert(match_data).execute()
+        # 1. Create Match, Participants and Ledger Event (source of truth) in one transaction,
+        # tagged with the running season
+        season = get_current_season()
+        participants = (
+            [{"user_id": uid, "team": "A"} for uid in team_a_ids]
+            + [{"user_id": uid, "team": "B"} for uid in team_b_ids]
+        )
+        res = supabase.rpc("record_match", {
+            "p_guild_id": GUILD_ID,
+            "p_winning_team": winning_team,
+            "p_map_name": map_name,
+            "p_attack_team": attack_team,
+            "p_season_id": season['id'] if season else None,
+            "p_participants": participants
+        }).execute()
         if not res.data:
             return False, "매치 생성 실패"
         
-        match_id = res.data[0]['id']
+        match = res.data[0]
+        match_id = match['id']
         
-        # 2. Add Participants
-        participants = []
-        for uid in team_a_ids:
-            participants.append({"match_id": match_id, "user_id": uid, "team": "A"})
-        for uid in team_b_ids:
-            participants.append({"match_id": match_id, "user_id": uid, "team": "B"})
-            
-        supabase.table("match_participants").insert(participants).execute()
+        # 2. Update Projections (Lifetime, Daily & Season)
+        deltas = build_stat_deltas(participants, winning_team)
+        drifted = apply_stat_deltas(match, deltas)
         
-        # 3. Update User Stats (Wins & Total Games)
-        # Fetch current stats
-        all_ids = team_a_ids + team_b_ids
-        users_res = supabase.table("users").select("id, wins, total_games").in_("id", all_ids).execute()
-        user_map = {u['id']: u for u in users_res.data}
+        # 3. Update Player Summaries
+        update_player_summaries(match_id, map_name, participants, winning_team)
+        invalidate_guild_cache(GUILD_ID)
         
-        updated_users = []
-        for uid in all_ids:
-            user = user_map.get(uid)
-            if user:
-                current_wins = user.get('wins', 0)
-                current_total = user.get('total_games', 0)
-                
-                # Determine if user won
-                is_team_a = uid in team_a_ids
-                user_won = (is_team_a and winning_team == 'A') or (not is_team_a and winning_team == 'B')
-                
-                new_wins = current_wins + (1 if user_won else 0)
-                new_total = current_total + 1
-                
-                updated_users.append({
-                    "id": uid,
-                    "wins": new_wins,
-                    "total_games": new_total
-                })
+        # 4. Refresh Ledger and Public Snapshots
+        snapshot_if_due()
+        publish_leaderboard_snapshot()
         
-        if updated_users:
-            supabase.table("users").upsert(updated_users).execute()
+        # 5. Teach the Win Model (a failure here must not fail the recorded match)
+        try:
+            users_res = supabase.table("users").select("id, tier").eq("guild_id", GUILD_ID).in_("id", team_a_ids + team_b_ids).execute()
+            get_win_model().add_match(match_id, team_a_ids, team_b_ids, winning_team, map_name, attack_team, get_tier_priorities(users_res.data))
+        except Exception as e:
+            print(f"Failed to update win model: {e}")
             
-        return True, "매치 결과가 저장되었습니다!"
+        return True, "매치 결과가 저장되었습니다!" + (DRIFT_WARNING if drifted else "")
         
     except Exception as e:
         return False, str(e)
 
 
+# --- Public Viewer Mode ---
+# Shared links (?view=leaderboard) get the read-only snapshot and stop here,
+# skipping the admin UI and every per-rerun query below.
+if st.query_params.get("view") == "leaderboard":
+    render_public_leaderboard()
+    record_run_timing()
+    st.stop()
+
 # --- UI Layout ---
 
-st.title("🔫 :Defying 내전 관리")
+st.title(f"🔫 {GUILD_NAMES[GUILD_ID] if len(GUILDS) > 1 else ':Defying'} 내전 관리")
 
 # Initialize Session State
 if 'team_a' not in st.session_state:
@@ -293,108 +962,74 @@ def calculate_team_avg_win_rate(team_ids, user_map):
     return total_wr / valid_members if valid_members > 0 else 0.0
 
 def delete_match(match_id):
-    """Deletes a match and reverts user stats."""
+    """Voids a match: appends a compensating ledger event and reverts the stat projections.
+    The match row is kept (marked voided) for the audit trail."""
     try:
-        # 1. Fetch Match Info to know who won
-        match_res = supabase.table("matches").select("*").eq("id", match_id).single().execute()
-        if not match_res.data:
-            return False, "매치를 찾을 수 없습니다."
-        
-        match_data = match_res.data
-        winning_team = match_data['winning_team'] # 'A' or 'B'
-        
-        # 2. Fetch Participants to know who played
-        parts_res = supabase.table("match_participants").select("*").eq("match_id", match_id).execute()
-        participants = parts_res.data
-        
-        # 3. Prepare User Stats Reversion
-        user_ids = [p['user_id'] for p in participants]
-        if user_ids:
-            users_res = supabase.table("users").select("id, wins, total_games").in_("id", user_ids).execute()
-            user_map = {u['id']: u for u in users_res.data}
+        # 1. Find the original event (it carries who played and who won)
+        events_res = supabase.table("ledger_events").select("*").eq("guild_id", GUILD_ID).eq("match_id", match_id).in_("event_type", STAT_EVENTS).order("id").execute()
+        events = events_res.data
+        if any(e['event_type'] == "match_voided" for e in events):
+            return False, "이미 취소된 매치입니다."
+        recorded = next((e for e in events if e['event_type'] == "match_recorded"), None)
+        
+        # 2. Mark Match as Voided and Append Compensating Event (one transaction)
+        if not supabase.rpc("void_match", {"p_guild_id": GUILD_ID, "p_match_id": match_id}).execute().data:
+            return False, "매치를 찾을 수 없거나 이미 취소된 매치입니다."
+        
+        # A match row without a 'match_recorded' event (left by a failed write before record_match became
+        # one transaction) never had its stats applied: marking it voided is all there is to undo.
+        drifted = []
+        if recorded:
+            payload = recorded['payload']
             
-            updated_users = []
-            for p in participants:
-                uid = p['user_id']
-                team = p['team'] # 'A' or 'B'
-                
-                user = user_map.get(uid)
-                if user:
-                    # Revert Stats
-                    current_wins = user['wins']
-                    current_total = user['total_games']
-                    
-                    # Logic: If they were on winning team, decrement win. Always decrement total.
-                    # Safety check: don't go below 0
-                    new_wins = current_wins
-                    if team == winning_team:
-                        new_wins = max(0, current_wins - 1)
-                    
-                    new_total = max(0, current_total - 1)
-                    
-                    updated_users.append({
-                        "id": uid,
-                        "wins": new_wins,
-                        "total_games": new_total
-                    })
+            # 3. Revert Projections (Lifetime, Daily & Season)
+            deltas = build_stat_deltas(payload['participants'], payload['winning_team'], sign=-1)
+            match_created_at = payload.get('match_created_at') or recorded['created_at']
+            drifted = apply_stat_deltas({"created_at": match_created_at, "season_id": payload.get('season_id')}, deltas)
             
-            # Update Users
-            if updated_users:
-                 supabase.table("users").upsert(updated_users).execute()
-        
-        # 4. Delete Participants (Must be done before deleting match if no CASCADE)
-        supabase.table("match_participants").delete().eq("match_id", match_id).execute()
+            # 4. Revert Affected Player Summaries
+            revert_player_summaries(match_id, payload.get('map_name'), payload['participants'], payload['winning_team'])
+            snapshot_if_due()
+        invalidate_guild_cache(GUILD_ID)
         
-        # 5. Delete Match
-        supabase.table("matches").delete().eq("id", match_id).execute()
+        # A voided match can't be un-learned incrementally; retrain on next use
+        reset_win_model()
+        publish_leaderboard_snapshot()
         
-        return True, "매치가 취소(삭제)되었습니다."
+        return True, "매치가 취소되었습니다." + (DRIFT_WARNING if drifted else "")
         
     except Exception as e:
         return False, str(e)
 
 def get_recent_matches(limit=10):
     """Fetches recent matches with participant info."""
-    # This is a bit complex with standard supabase client without joins.
-    # We'll fetch matches, then fetch participants for them.
+    # One round trip: participants and their names are embedded through the foreign keys
+    # (matches <- match_participants -> users) instead of three dependent queries.
     try:
-        matches_res = supabase.table("matches").select("*").order("created_at", desc=True).limit(limit).execute()
+        matches_res = (
+            supabase.table("matches")
+            .select("*, match_participants(team, users(display_name))")
+            .eq("guild_id", GUILD_ID)
+            .is_("voided_at", "null")
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
         matches = matches_res.data
         if not matches:
             return []
             
-        match_ids = [m['id'] for m in matches]
-        
-        # Fetch participants
-        parts_res = supabase.table("match_participants").select("match_id, team, user_id").in_("match_id", match_ids).execute()
-        parts = parts_res.data
-        
-        # Fetch user names
-        all_user_ids = list(set([p['user_id'] for p in parts]))
-        if all_user_ids:
-            users_res = supabase.table("users").select("id, display_name").in_("id", all_user_ids).execute()
-            user_map = {u['id']: u['display_name'] for u in users_res.data}
-        else:
-            user_map = {}
-            
-        # Group participants by match
-        # Structure: {match_id: {'A': [names], 'B': [names]}}
-        match_details = {}
-        for p in parts:
-            mid = p['match_id']
-            if mid not in match_details:
-                match_details[mid] = {'A': [], 'B': []}
-            
-            u_name = user_map.get(p['user_id'], "Unknown")
-            match_details[mid][p['team']].append(u_name)
-            
         # Combine
         full_history = []
         for m in matches:
-            mid = m['id']
-            details = match_details.get(mid, {'A': [], 'B': []})
+            # Structure: {'A': [names], 'B': [names]}
+            details = {'A': [], 'B': []}
+            for p in m.get('match_participants') or []:
+                u_name = (p.get('users') or {}).get('display_name') or "Unknown"
+                details[p['team']].append(u_name)
+            
             full_history.append({
-                "id": mid,
+                "id": m['id'],
                 "created_at": m['created_at'],
                 "winning_team": m['winning_team'],
                 "map_name": m.get('map_name'), # Include map_name
@@ -407,6 +1042,43 @@ def get_recent_matches(limit=10):
         st.error(f"기록 불러오기 실패: {str(e)}")
         return []
 
+# --- PAGE DATA ---
+# Each view declares its data dependencies up front. Only the active view's
+# dependencies are loaded, concurrently, so a rerun waits on the slowest query
+# instead of the sum of all of them.
+TABS = ["🏆 리더보드", "📝 매치 생성", "📜 최근 기록", "👤 프로필"]
+HISTORY_LIMIT = 20
+FETCH_WORKERS = 4
+
+DATA_LOADERS = {
+    "users": get_all_users,
+    "maps": get_all_maps,
+    "seasons": get_all_seasons,
+    "history": lambda: get_recent_matches(limit=HISTORY_LIMIT),
+    "events": get_recent_events,
+}
+
+PAGE_DEPENDENCIES = {
+    "🏆 리더보드": ["users", "seasons"],
+    "📝 매치 생성": ["users", "maps"],
+    "📜 최근 기록": ["users", "history", "events"],
+    "👤 프로필": ["users"],
+}
+
+def fetch_page_data(keys):
+    """Runs the loaders for `keys` on a bounded thread pool and returns {key: result}."""
+    from concurrent.futures import ThreadPoolExecutor
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+    # Worker threads need the script context so st.error / st.cache_data work inside loaders
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=min(FETCH_WORKERS, len(keys)),
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx),
+    ) as pool:
+        futures = {key: pool.submit(DATA_LOADERS[key]) for key in keys}
+        return {key: future.result() for key, future in futures.items()}
+
 @st.dialog("맵 관리 (Map Management)")
 def add_map_dialog():
     st.write("### 🆕 맵 추가")
@@ -436,6 +1108,40 @@ def add_map_dialog():
     else:
         st.info("등록된 맵이 없습니다.")
 
+@st.dialog("시즌 관리 (Season Management)")
+def season_dialog():
+    current = get_current_season()
+    if current:
+        st.write(f"### 🏁 현재 시즌: {current['name']}")
+        st.caption(f"시작: {current['started_at'][:16].replace('T', ' ')}")
+    else:
+        st.info("진행 중인 시즌이 없습니다.")
+    
+    st.divider()
+    
+    st.write("### 🆕 새 시즌 시작")
+    st.caption("현재 시즌은 종료되고, 이후 기록되는 매치는 새 시즌으로 집계됩니다. 전체 기록은 유지됩니다.")
+    new_season_name = st.text_input("시즌 이름", placeholder="예: 2025 시즌 1")
+    if st.button("시즌 시작하기", type="primary", use_container_width=True):
+        if new_season_name:
+            s, m = start_new_season(new_season_name)
+            if s:
+                st.success(m)
+                time.sleep(1)
+                st.rerun()
+            else:
+                st.error(m)
+
+@st.dialog("승률 모델 리포트 (Calibration)", width="large")
+def model_report_dialog():
+    st.caption("과거 매치의 앞 80%로 학습한 뒤, 최근 20%를 순서대로 예측·학습하며 보정(calibration) 상태를 평가합니다.")
+    if st.button("리포트 생성", type="primary", use_container_width=True):
+        from win_model import calibration_report, format_report
+        with st.spinner("평가 중..."):
+            users = supabase.table("users").select("id, tier").eq("guild_id", GUILD_ID).execute().data
+            report = calibration_report(load_match_history(), get_tier_priorities(users))
+        st.markdown(format_report(report))
+
 @st.dialog("고급 설정 (Advanced Settings)")
 def advanced_settings_dialog():
     st.write("### ⚙️ 표시 설정")
@@ -446,16 +1152,31 @@ def advanced_settings_dialog():
     
     new_show_individual = st.checkbox("개인 승률 표시 (Player Win Rate)", value=st.session_state.show_individual_wr)
     new_show_team = st.checkbox("팀 평균 승률 표시 (Team Avg Win Rate)", value=st.session_state.show_team_wr)
+    new_show_perf = st.checkbox("성능 정보 표시 (Rerun Timing)", value=st.session_state.get('show_perf', False))
     
     st.divider()
     
     if st.button("확인 (Apply)", type="primary", use_container_width=True):
         st.session_state.show_individual_wr = new_show_individual
         st.session_state.show_team_wr = new_show_team
+        st.session_state.show_perf = new_show_perf
         st.rerun()
 
+def reset_lobby():
+    """Clears team building state (user ids belong to the previously selected guild)."""
+    st.session_state.team_a = []
+    st.session_state.team_b = []
+    st.session_state.participants = set()
+    st.session_state.selected_map = None
+    st.session_state.attack_team = None
+    st.session_state.pop('profile_user', None)
+
 # Sidebar: Sync & Maps
 with st.sidebar:
+    # Guild Selector (binds straight to session_state.guild_id, read at the top of the next run)
+    if len(GUILDS) > 1:
+        st.selectbox("서버 (Guild)", list(GUILDS.values()), format_func=GUILD_NAMES.get, key="guild_id", on_change=reset_lobby)
+    
     st.header("설정 (Settings)")
     
     # Advanced Settings Button
@@ -464,7 +1185,7 @@ with st.sidebar:
         
     if st.button("디스코드 멤버 동기화", use_container_width=True):
         with st.spinner("동기화 중..."):
-            count, msg = sync_discord_members()
+            count, msg = sync_discord_members(GUILD_ID)
             if count > 0:
                 st.success(f"{count}명 동기화 완료!")
                 time.sleep(1)
@@ -472,23 +1193,69 @@ with st.sidebar:
             else:
                 st.error(f"실패: {msg}")
     
+    if len(GUILDS) > 1 and st.button("전체 서버 동기화", use_container_width=True):
+        # One sync job per guild; each only invalidates its own guild's caches
+        for name, gid in GUILDS.items():
+            with st.spinner(f"{name} 동기화 중..."):
+                count, msg = sync_discord_members(gid)
+            if count > 0:
+                st.success(f"{name}: {count}명 동기화 완료")
+            else:
+                st.error(f"{name}: 실패 ({msg})")
+    
     st.divider()
     
     st.header("맵 관리 (Maps)")
     
     if st.button("🗺️ 맵 관리하기", use_container_width=True):
         add_map_dialog()
+    
+    st.divider()
+    
+    st.header("시즌 관리 (Seasons)")
+    
+    if st.button("🏁 시즌 관리하기", use_container_width=True):
+        season_dialog()
+    
+    if st.button("📈 승률 모델 리포트", use_container_width=True):
+        model_report_dialog()
+    
+    if st.button("🧮 통계 재구성 (Ledger)", use_container_width=True, help="원장(ledger)으로 전체 승/패 통계, 일별·시즌별 집계와 플레이어 프로필 요약을 다시 계산합니다."):
+        with st.spinner("재구성 중..."):
+            success, msg = rebuild_user_stats()
+        if success:
+            st.success(msg)
+            time.sleep(1)
+            st.rerun()
+        else:
+            st.error(f"실패: {msg}")
+    
+    if st.session_state.get('show_perf'):
+        st.divider()
+        st.header("성능 (Performance)")
+        process_stats = get_process_stats()
+        if process_stats["cold_start_ms"] is not None:
+            st.caption(f"콜드 스타트: {process_stats['cold_start_ms']:.0f} ms | 프로세스 실행 횟수: {process_stats['reruns']}")
+        if 'last_rerun_ms' in st.session_state:
+            st.caption(f"직전 실행: {st.session_state.last_rerun_ms:.0f} ms")
+            for label, ms in st.session_state.get('last_perf_timings', {}).items():
+                st.caption(f"- {label}: {ms:.0f} ms")
+
 
 
+# Navigation (only the selected view is rendered and fetched)
+active_tab = st.radio("메뉴", TABS, horizontal=True, label_visibility="collapsed", key="active_tab")
 
 # Main Data Fetch
-users = get_all_users()
-df = pd.DataFrame(users)
+with perf_timer("데이터 조회"):
+    page_data = fetch_page_data(PAGE_DEPENDENCIES[active_tab])
+users = page_data["users"]
 
-if not df.empty:
-    df['win_rate'] = df.apply(lambda row: (row['wins'] / row['total_games'] * 100) if row['total_games'] > 0 else 0.0, axis=1)
-    df_sorted = df.sort_values(by=['win_rate', 'wins'], ascending=False)
-    id_map = {row['id']: row for _, row in df.iterrows()}
+if users:
+    with perf_timer("데이터프레임 구성"):
+        df = build_user_frame(users)
+        df_sorted = df.sort_values(by=['win_rate', 'wins'], ascending=False)
+    id_map = {u['id']: u for u in users}
     
     # Initialize Settings State
     if 'show_individual_wr' not in st.session_state:
@@ -496,12 +1263,42 @@ if not df.empty:
     if 'show_team_wr' not in st.session_state:
         st.session_state.show_team_wr = True
     
-    # Tabs
-    tab1, tab2, tab3 = st.tabs(["🏆 리더보드", "📝 매치 생성", "📜 최근 기록"])
-    
-    with tab1:
+    if active_tab == "🏆 리더보드":
         st.subheader("📊 순위표")
         
+        # Leaderboard Window (lifetime stats live on users, the rest come from rollups)
+        window_options = {"전체 기간": ("lifetime", None)}
+        for season in page_data["seasons"]:
+            label = f"🏁 {season['name']}" + (" (진행 중)" if not season.get('ended_at') else "")
+            window_options[label] = ("season", season['id'])
+        window_options[f"최근 {RECENT_DAYS}일"] = ("days", RECENT_DAYS)
+        window_options["최근 N경기"] = ("recent", None)
+        window_options["📅 특정 시점"] = ("as_of", None)
+        
+        c_window, c_n = st.columns([3, 1])
+        with c_window:
+            window_label = st.selectbox("기간", list(window_options.keys()), key="lb_window")
+        window_kind, window_param = window_options[window_label]
+        if window_kind == "recent":
+            with c_n:
+                window_param = st.number_input("경기 수 (N)", min_value=1, max_value=100, value=10, step=1)
+        elif window_kind == "as_of":
+            with c_n:
+                as_of_date = st.date_input("기준일 (UTC)", value=datetime.now(timezone.utc).date())
+            # End of the chosen day, replayed from the ledger
+            window_param = datetime.combine(as_of_date + timedelta(days=1), datetime.min.time(), timezone.utc).isoformat()
+        
+        if window_kind == "lifetime":
+            lb_df = df_sorted
+        else:
+            window_stats = get_window_stats(window_kind, window_param)
+            lb_df = df[df['id'].isin(window_stats.keys())].copy()
+            lb_df['wins'] = lb_df['id'].map(lambda uid: window_stats[uid][0])
+            lb_df['total_games'] = lb_df['id'].map(lambda uid: window_stats[uid][1])
+            lb_df = lb_df[lb_df['total_games'] > 0]
+            lb_df['win_rate'] = lb_df['wins'] / lb_df['total_games'] * 100
+            lb_df = lb_df.sort_values(by=['win_rate', 'wins'], ascending=False)
+        
         # Select columns based on settings
         lb_cols = ['display_name', 'tier', 'wins', 'total_games']
         lb_config = {
@@ -516,13 +1313,14 @@ if not df.empty:
             lb_config["win_rate"] = st.column_config.NumberColumn("승률 (%)", format="%.1f %%")
             
         st.dataframe(
-            df_sorted[lb_cols],
+            lb_df[lb_cols],
             column_config=lb_config,
             hide_index=True,
             use_container_width=True
         )
+        st.caption(f"🔗 공유용 읽기 전용 순위표: 주소 끝에 `?view=leaderboard&guild={GUILD_ID}`를 붙여 공유하세요.")
 
-    with tab2:
+    if active_tab == "📝 매치 생성":
         
         # Calculate Team Stats
         team_a_avg = calculate_team_avg_win_rate(st.session_state.team_a, id_map)
@@ -575,6 +1373,14 @@ if not df.empty:
             if st.session_state.show_team_wr:
                 diff = abs(team_a_avg - team_b_avg)
                 st.markdown(f"<div style='text-align: center; color: gray; font-size: 0.8em;'>차이: {diff:.1f}%</div>", unsafe_allow_html=True)
+            if st.session_state.team_a and st.session_state.team_b:
+                # Predicted A-vs-B win probability (in-memory model, updates on every move)
+                p_a = get_win_model().predict(
+                    st.session_state.team_a, st.session_state.team_b,
+                    st.session_state.get('selected_map'), st.session_state.attack_team,
+                    get_tier_priorities(users)
+                )
+                st.markdown(f"<div style='text-align: center; font-size: 0.9em; margin-top: 8px;'>예상 승률<br><b>{p_a * 100:.0f}% : {(1 - p_a) * 100:.0f}%</b></div>", unsafe_allow_html=True)
 
         with col_team_b:
             header_text = header_b
@@ -642,7 +1448,7 @@ if not df.empty:
         st.divider()
         
         # --- Random Map Selector ---
-        all_maps = get_all_maps()
+        all_maps = page_data["maps"]
         map_names = [m['name'] for m in all_maps] if all_maps else []
         
         # Remove Header "#### 🗺️ 맵 선택" as requested
@@ -741,7 +1547,7 @@ if not df.empty:
                     st.toast("⚠️ 맵이 선택되지 않았습니다. 맵을 돌려주세요!", icon="⚠️")
                 else:
                     mapped_winner = "A" if winning_team == "A팀" else "B"
-                    success, msg = record_match(st.session_state.team_a, st.session_state.team_b, mapped_winner, st.session_state.selected_map)
+                    success, msg = record_match(st.session_state.team_a, st.session_state.team_b, mapped_winner, st.session_state.selected_map, st.session_state.attack_team)
                     if success:
                         st.success(msg)
                         # Reset map and attack side, keep teams? Or reset teams too?
@@ -767,9 +1573,6 @@ if not df.empty:
         if search_query:
             filtered_df = df_sorted[filtered_df['display_name'].str.contains(search_query, case=False) | filtered_df['name'].str.contains(search_query, case=False)]
 
-        # Ordered Rank List for Display
-        RANK_ORDER = ["레디언트", "불멸", "초월자", "다이아몬드", "플래티넘", "골드", "실버", "브론즈", "아이언", "언랭"]
-        
         for rank in RANK_ORDER:
             # Filter users in this rank
             rank_users = filtered_df[filtered_df['tier'] == rank]
@@ -807,11 +1610,102 @@ if not df.empty:
                                         toggle_participation(uid)
                                         st.rerun()
 
-    with tab3:
+    if active_tab == "👤 프로필":
+        st.subheader("👤 플레이어 프로필")
+        
+        players = sorted(users, key=lambda u: u['display_name'] or "")
+        profile_uid = st.selectbox("플레이어", [u['id'] for u in players], format_func=lambda uid: id_map[uid]['display_name'], key="profile_user")
+        
+        # Keyset pagination: a stack of 'before match_id' cursors, reset when the player changes
+        if st.session_state.get('profile_cursor_owner') != profile_uid:
+            st.session_state.profile_cursor_owner = profile_uid
+            st.session_state.profile_cursors = [None]
+        
+        summary, page, lineups, has_more = get_player_profile(profile_uid, st.session_state.profile_cursors[-1])
+        
+        def name_of(uid):
+            u = id_map.get(int(uid))
+            return u['display_name'] if u is not None else "Unknown"
+        
+        # Summary
+        total = summary['total_games']
+        wins = summary['wins']
+        streak = summary['current_streak']
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("전체 승률", f"{(wins / total * 100) if total > 0 else 0.0:.1f}%")
+        c2.metric("전적", f"{wins}승 {total - wins}패")
+        c3.metric("현재 연속", f"{streak}연승" if streak > 0 else (f"{-streak}연패" if streak < 0 else "-"))
+        c4.metric("최다 연승", f"{summary['best_win_streak']}연승")
+        
+        # Rolling Win Rate (last SUMMARY_RECENT matches, 5-match window)
+        recent = [won for _, won in summary['recent_results']]
+        if recent:
+            st.markdown(f"#### 📈 최근 {len(recent)}경기 폼 ({sum(recent) / len(recent) * 100:.0f}%)")
+            st.caption(" ".join("🟢" if won else "🔴" for won in recent))
+            rolling = [sum(recent[max(0, i - 4):i + 1]) / len(recent[max(0, i - 4):i + 1]) * 100 for i in range(len(recent))]
+            st.line_chart({"최근 5경기 승률 (%)": rolling}, height=200)
+        
+        c_map, c_mates, c_opps = st.columns(3)
+        with c_map:
+            st.markdown("#### 🗺️ 맵별 전적")
+            map_rows = [
+                {"맵": name, "경기": g, "승률 (%)": round(w / g * 100, 1)}
+                for name, (w, g) in sorted(summary['map_stats'].items(), key=lambda kv: -kv[1][1])
+            ]
+            if map_rows:
+                st.dataframe(map_rows, hide_index=True, use_container_width=True)
+            else:
+                st.caption("기록 없음")
+        
+        for col, key, title in ((c_mates, 'teammates', "🤝 자주 함께한 팀원"), (c_opps, 'opponents', "⚔️ 자주 만난 상대")):
+            with col:
+                st.markdown(f"#### {title}")
+                top = sorted(summary[key].items(), key=lambda kv: -kv[1][1])[:5]
+                if top:
+                    st.dataframe(
+                        [{"플레이어": name_of(uid), "경기": g, "승률 (%)": round(w / g * 100, 1)} for uid, (w, g) in top],
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                else:
+                    st.caption("기록 없음")
+        
+        st.divider()
+        
+        # Match Timeline
+        st.markdown("#### 📜 매치 타임라인")
+        if page:
+            for m in page:
+                match = m['matches']
+                won = m['team'] == match['winning_team']
+                created_at = match['created_at'][:16].replace("T", " ")
+                lineup = lineups.get(m['match_id'], [])
+                mates = [name_of(p['user_id']) for p in lineup if p['team'] == m['team'] and p['user_id'] != profile_uid]
+                opps = [name_of(p['user_id']) for p in lineup if p['team'] != m['team']]
+                st.markdown(f"{'🟢 **승리**' if won else '🔴 **패배**'} · 매치 #{m['match_id']} ({created_at}) | 🗺️ {match.get('map_name') or '알 수 없음'}")
+                st.caption(f"팀원: {', '.join(mates) or '-'} / 상대: {', '.join(opps) or '-'}")
+        else:
+            st.info("기록된 매치가 없습니다.")
+        
+        def newer_page():
+            st.session_state.profile_cursors.pop()
+        
+        def older_page(cursor):
+            st.session_state.profile_cursors.append(cursor)
+        
+        c_prev, c_page, c_next = st.columns([1, 2, 1])
+        with c_prev:
+            st.button("◀ 최신", disabled=len(st.session_state.profile_cursors) <= 1, on_click=newer_page, use_container_width=True)
+        with c_page:
+            st.markdown(f"<div style='text-align: center; color: gray;'>{len(st.session_state.profile_cursors)} 페이지</div>", unsafe_allow_html=True)
+        with c_next:
+            st.button("이전 ▶", disabled=not has_more, on_click=older_page, args=(page[-1]['match_id'] if page else None,), use_container_width=True)
+
+    if active_tab == "📜 최근 기록":
         st.subheader("📜 최근 매치 기록")
-        st.caption("최근 20개의 매치를 보여줍니다. 잘못 기록된 매치는 삭제(취소)할 수 있습니다.")
+        st.caption(f"최근 {HISTORY_LIMIT}개의 매치를 보여줍니다. 잘못 기록된 매치는 삭제(취소)할 수 있습니다.")
         
-        history = get_recent_matches(limit=20)
+        history = page_data["history"]
         
         if history:
             for match in history:
@@ -839,9 +1733,34 @@ if not df.empty:
                     st.divider()
         else:
             st.info("아직 기록된 매치가 없습니다.")
+        
+        # Audit Trail (append-only ledger)
+        with st.expander("🧾 감사 로그 (Ledger)"):
+            EVENT_LABELS = {
+                "match_recorded": "매치 기록",
+                "match_voided": "매치 취소",
+                "member_synced": "멤버 동기화",
+                "map_changed": "맵 변경"
+            }
+            events = page_data["events"]
+            if events:
+                for e in events:
+                    created_at = e['created_at'][:16].replace("T", " ")
+                    label = EVENT_LABELS.get(e['event_type'], e['event_type'])
+                    detail = f"매치 #{e['match_id']}" if e.get('match_id') else ""
+                    if e['event_type'] == "map_changed":
+                        detail = f"{e['payload'].get('name')} ({e['payload'].get('action')})"
+                    elif e['event_type'] == "member_synced":
+                        detail = f"{len(e['payload'].get('members', []))}명"
+                    st.caption(f"#{e['id']} · {created_at} · **{label}** {detail}")
+            else:
+                st.caption("기록된 이벤트가 없습니다.")
 
 
 
 else:
     st.info("등록된 멤버가 없습니다. 왼쪽 사이드바에서 '디스코드 멤버 동기화'를 눌러주세요.")
 
+
+# --- Rerun Timing ---
+record_run_timing()
@@ -0,0 +1,102 @@
+"""Incremental player profile summaries (the player_summaries rows).
+
+A summary is folded forward one match at a time when a match is recorded and
+has a voided match subtracted again. The streak fields can't be undone from
+counts alone, so after a void (or an out-of-order fold) they are replaced with
+values recomputed from the player's history (apply_streaks). Pure Python, no
+Streamlit or Supabase.
+"""
+
+SUMMARY_RECENT = 20 # results kept for rolling win rate / streak display
+UNKNOWN_MAP = "알 수 없음"
+STREAK_FIELDS = ["current_streak", "best_win_streak", "recent_results", "last_match_id"] # depend on match order
+
+
+def empty_summary(guild_id, user_id):
+    return {
+        "guild_id": guild_id,
+        "user_id": user_id,
+        "wins": 0,
+        "total_games": 0,
+        "current_streak": 0,
+        "best_win_streak": 0,
+        "recent_results": [],
+        "map_stats": {},
+        "teammates": {},
+        "opponents": {},
+        "last_match_id": None
+    }
+
+
+def match_sides(participants, user_id):
+    """Returns (team, teammates, opponents) of user_id among a match's participants."""
+    team = next(p['team'] for p in participants if p['user_id'] == user_id)
+    teammates = [p['user_id'] for p in participants if p['team'] == team and p['user_id'] != user_id]
+    opponents = [p['user_id'] for p in participants if p['team'] != team]
+    return team, teammates, opponents
+
+
+def _records(map_name, teammates, opponents):
+    return (("map_stats", [map_name or UNKNOWN_MAP]), ("teammates", teammates), ("opponents", opponents))
+
+
+def is_folded(summary, match_id):
+    """True if match_id is already part of the summary (as far as the recent window can tell)."""
+    return summary['last_match_id'] == match_id or any(mid == match_id for mid, _ in summary['recent_results'])
+
+
+def is_in_order(summary, match_id):
+    """True if match_id is newer than every match already folded, so fold_summary keeps the streaks exact."""
+    return not summary['last_match_id'] or match_id > summary['last_match_id']
+
+
+def fold_summary(summary, match_id, map_name, won, teammates, opponents):
+    """Adds one match to a summary (in place). JSON object keys are strings.
+
+    A match older than last_match_id (recorded concurrently, committed out of order) still
+    updates every count, but leaves the streaks alone: recompute them with apply_streaks."""
+    in_order = is_in_order(summary, match_id)
+    summary['wins'] += 1 if won else 0
+    summary['total_games'] += 1
+    for table, keys in _records(map_name, teammates, opponents):
+        for key in keys:
+            wins, games = summary[table].get(str(key), (0, 0))
+            summary[table][str(key)] = [wins + (1 if won else 0), games + 1]
+
+    results = sorted(summary['recent_results'] + [[match_id, 1 if won else 0]])
+    summary['recent_results'] = results[-SUMMARY_RECENT:]
+    if in_order:
+        streak = summary['current_streak']
+        if won:
+            summary['current_streak'] = streak + 1 if streak > 0 else 1
+        else:
+            summary['current_streak'] = streak - 1 if streak < 0 else -1
+        summary['best_win_streak'] = max(summary['best_win_streak'], summary['current_streak'])
+        summary['last_match_id'] = match_id
+    return summary
+
+
+def unfold_summary(summary, match_id, map_name, won, teammates, opponents):
+    """Subtracts a voided match from a summary's counts (in place).
+
+    The streaks and the recent window can't be reverted from counts: follow with apply_streaks."""
+    summary['wins'] -= 1 if won else 0
+    summary['total_games'] -= 1
+    for table, keys in _records(map_name, teammates, opponents):
+        for key in keys:
+            wins, games = summary[table].get(str(key), (0, 0))
+            if games <= 1:
+                summary[table].pop(str(key), None)
+            else:
+                summary[table][str(key)] = [wins - (1 if won else 0), games - 1]
+    summary['recent_results'] = [r for r in summary['recent_results'] if r[0] != match_id]
+    return summary
+
+
+def apply_streaks(summary, streaks):
+    """Replaces the STREAK_FIELDS of a summary with a row recomputed from history (in place).
+    streaks=None means the player has no (non-voided) matches left."""
+    fresh = streaks or empty_summary(summary['guild_id'], summary['user_id'])
+    for field in STREAK_FIELDS:
+        summary[field] = fresh[field]
+    return summary
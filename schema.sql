@@ -30,3 +30,449 @@ CREATE TABLE maps (
     id SERIAL PRIMARY KEY,
     name TEXT UNIQUE
 );
+
+-- Create seasons table (New)
+-- ended_at is NULL while the season is running
+CREATE TABLE IF NOT EXISTS seasons (
+    id SERIAL PRIMARY KEY,
+    name TEXT,
+    started_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+    ended_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Tag each match with the season it was played in
+ALTER TABLE matches ADD COLUMN IF NOT EXISTS season_id INT REFERENCES seasons(id);
+
+-- Voided matches are kept for the audit trail and excluded from stats
+ALTER TABLE matches ADD COLUMN IF NOT EXISTS voided_at TIMESTAMP WITH TIME ZONE;
+
+-- Rollup tables, maintained incrementally by record_match / delete_match
+CREATE TABLE IF NOT EXISTS user_daily_stats (
+    user_id BIGINT REFERENCES users(id),
+    day DATE, -- UTC date of the match
+    wins INT DEFAULT 0,
+    total_games INT DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+CREATE INDEX IF NOT EXISTS user_daily_stats_day_idx ON user_daily_stats (day);
+
+CREATE TABLE IF NOT EXISTS user_season_stats (
+    season_id INT REFERENCES seasons(id),
+    user_id BIGINT REFERENCES users(id),
+    wins INT DEFAULT 0,
+    total_games INT DEFAULT 0,
+    PRIMARY KEY (season_id, user_id)
+);
+
+-- "Last N matches" leaderboard: one index range scan per player
+CREATE INDEX IF NOT EXISTS match_participants_user_match_idx ON match_participants (user_id, match_id DESC);
+
+CREATE OR REPLACE FUNCTION recent_form(match_limit INT)
+RETURNS TABLE (user_id BIGINT, wins BIGINT, total_games BIGINT) AS $$
+    SELECT u.id,
+           COUNT(*) FILTER (WHERE r.team = r.winning_team),
+           COUNT(*)
+    FROM users u
+    CROSS JOIN LATERAL (
+        SELECT mp.team, m.winning_team
+        FROM match_participants mp
+        JOIN matches m ON m.id = mp.match_id
+        WHERE mp.user_id = u.id AND m.voided_at IS NULL
+        ORDER BY mp.match_id DESC
+        LIMIT match_limit
+    ) r
+    GROUP BY u.id;
+$$ LANGUAGE sql STABLE;
+
+-- Backfill daily rollups from existing history (only fills an empty table)
+INSERT INTO user_daily_stats (user_id, day, wins, total_games)
+SELECT mp.user_id,
+       (m.created_at AT TIME ZONE 'utc')::date,
+       COUNT(*) FILTER (WHERE mp.team = m.winning_team),
+       COUNT(*)
+FROM match_participants mp
+JOIN matches m ON m.id = mp.match_id
+WHERE m.voided_at IS NULL
+  AND NOT EXISTS (SELECT 1 FROM user_daily_stats)
+GROUP BY 1, 2;
+
+-- Record which team attacked first (used by the win-probability model)
+ALTER TABLE matches ADD COLUMN IF NOT EXISTS attack_team TEXT; -- 'A', 'B' or NULL
+
+-- Append-only ledger (New). Stats are a projection of these events;
+-- voiding a match appends a compensating 'match_voided' event.
+CREATE TABLE IF NOT EXISTS ledger_events (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+    event_type TEXT NOT NULL, -- 'match_recorded', 'match_voided', 'member_synced', 'map_changed'
+    match_id INT REFERENCES matches(id),
+    payload JSONB
+);
+CREATE INDEX IF NOT EXISTS ledger_events_match_idx ON ledger_events (match_id);
+CREATE INDEX IF NOT EXISTS ledger_events_created_idx ON ledger_events (created_at);
+
+-- Periodic stats snapshots: state = latest snapshot + replay of later events
+CREATE TABLE IF NOT EXISTS ledger_snapshots (
+    id SERIAL PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+    last_event_id BIGINT, -- events up to and including this id are folded in
+    event_time TIMESTAMP WITH TIME ZONE, -- created_at of that event
+    stats JSONB -- {"user_id": [wins, total_games]}
+);
+CREATE INDEX IF NOT EXISTS ledger_snapshots_event_time_idx ON ledger_snapshots (event_time);
+
+-- Backfill 'match_recorded' events for matches recorded before the ledger existed (safe to re-run)
+INSERT INTO ledger_events (created_at, event_type, match_id, payload)
+SELECT m.created_at, 'match_recorded', m.id, jsonb_build_object(
+           'winning_team', m.winning_team,
+           'map_name', m.map_name,
+           'attack_team', m.attack_team,
+           'season_id', m.season_id,
+           'participants', COALESCE((
+               SELECT jsonb_agg(jsonb_build_object('user_id', mp.user_id, 'team', mp.team))
+               FROM match_participants mp WHERE mp.match_id = m.id
+           ), '[]'::jsonb)
+       )
+FROM matches m
+WHERE m.voided_at IS NULL
+  AND NOT EXISTS (SELECT 1 FROM ledger_events e WHERE e.match_id = m.id)
+ORDER BY m.id;
+
+-- Multi-guild tenancy (New, run once)
+-- Every table is partitioned by guild_id and every key / index is led by it.
+-- Existing single-guild data: replace 0 below with your previous GUILD_ID before running.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE maps ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE seasons ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE matches ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE match_participants ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE user_daily_stats ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE user_season_stats ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE ledger_events ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE ledger_snapshots ADD COLUMN IF NOT EXISTS guild_id BIGINT NOT NULL DEFAULT 0;
+
+ALTER TABLE users ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE maps ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE seasons ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE matches ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE match_participants ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE user_daily_stats ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE user_season_stats ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE ledger_events ALTER COLUMN guild_id DROP DEFAULT;
+ALTER TABLE ledger_snapshots ALTER COLUMN guild_id DROP DEFAULT;
+
+-- A Discord user can belong to several guilds: users are keyed by (guild_id, id)
+ALTER TABLE match_participants DROP CONSTRAINT IF EXISTS match_participants_user_id_fkey;
+ALTER TABLE user_daily_stats DROP CONSTRAINT IF EXISTS user_daily_stats_user_id_fkey;
+ALTER TABLE user_season_stats DROP CONSTRAINT IF EXISTS user_season_stats_user_id_fkey;
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_pkey;
+ALTER TABLE users ADD PRIMARY KEY (guild_id, id);
+ALTER TABLE match_participants ADD FOREIGN KEY (guild_id, user_id) REFERENCES users(guild_id, id);
+
+ALTER TABLE maps DROP CONSTRAINT IF EXISTS maps_name_key;
+ALTER TABLE maps ADD UNIQUE (guild_id, name);
+
+ALTER TABLE user_daily_stats DROP CONSTRAINT IF EXISTS user_daily_stats_pkey;
+ALTER TABLE user_daily_stats ADD PRIMARY KEY (guild_id, day, user_id);
+ALTER TABLE user_daily_stats ADD FOREIGN KEY (guild_id, user_id) REFERENCES users(guild_id, id);
+DROP INDEX IF EXISTS user_daily_stats_day_idx;
+
+ALTER TABLE user_season_stats DROP CONSTRAINT IF EXISTS user_season_stats_pkey;
+ALTER TABLE user_season_stats ADD PRIMARY KEY (guild_id, season_id, user_id);
+ALTER TABLE user_season_stats ADD FOREIGN KEY (guild_id, user_id) REFERENCES users(guild_id, id);
+
+CREATE INDEX IF NOT EXISTS seasons_guild_started_idx ON seasons (guild_id, started_at DESC);
+CREATE INDEX IF NOT EXISTS matches_guild_created_idx ON matches (guild_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS matches_guild_id_idx ON matches (guild_id, id);
+DROP INDEX IF EXISTS match_participants_user_match_idx;
+CREATE INDEX IF NOT EXISTS match_participants_guild_user_match_idx ON match_participants (guild_id, user_id, match_id DESC);
+CREATE INDEX IF NOT EXISTS match_participants_match_idx ON match_participants (match_id);
+DROP INDEX IF EXISTS ledger_events_created_idx;
+CREATE INDEX IF NOT EXISTS ledger_events_guild_id_idx ON ledger_events (guild_id, id);
+CREATE INDEX IF NOT EXISTS ledger_events_guild_created_idx ON ledger_events (guild_id, created_at);
+DROP INDEX IF EXISTS ledger_snapshots_event_time_idx;
+CREATE INDEX IF NOT EXISTS ledger_snapshots_guild_event_idx ON ledger_snapshots (guild_id, last_event_id DESC);
+CREATE INDEX IF NOT EXISTS ledger_snapshots_guild_time_idx ON ledger_snapshots (guild_id, event_time);
+
+DROP FUNCTION IF EXISTS recent_form(INT);
+CREATE OR REPLACE FUNCTION recent_form(match_limit INT, p_guild_id BIGINT)
+RETURNS TABLE (user_id BIGINT, wins BIGINT, total_games BIGINT) AS $$
+    SELECT u.id,
+           COUNT(*) FILTER (WHERE r.team = r.winning_team),
+           COUNT(*)
+    FROM users u
+    CROSS JOIN LATERAL (
+        SELECT mp.team, m.winning_team
+        FROM match_participants mp
+        JOIN matches m ON m.id = mp.match_id
+        WHERE mp.guild_id = p_guild_id AND mp.user_id = u.id AND m.voided_at IS NULL
+        ORDER BY mp.match_id DESC
+        LIMIT match_limit
+    ) r
+    WHERE u.guild_id = p_guild_id
+    GROUP BY u.id;
+$$ LANGUAGE sql STABLE;
+
+-- Per-player profile summary (New), updated incrementally by record_match
+CREATE TABLE IF NOT EXISTS player_summaries (
+    guild_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    wins INT DEFAULT 0,
+    total_games INT DEFAULT 0,
+    current_streak INT DEFAULT 0, -- > 0: win streak, < 0: loss streak
+    best_win_streak INT DEFAULT 0,
+    recent_results JSONB DEFAULT '[]'::jsonb, -- [[match_id, 1 | 0], ...] oldest first, last 20
+    map_stats JSONB DEFAULT '{}'::jsonb, -- {"map": [wins, games]}
+    teammates JSONB DEFAULT '{}'::jsonb, -- {"user_id": [wins together, games together]}
+    opponents JSONB DEFAULT '{}'::jsonb, -- {"user_id": [wins against, games against]}
+    last_match_id INT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+    PRIMARY KEY (guild_id, user_id),
+    FOREIGN KEY (guild_id, user_id) REFERENCES users(guild_id, id)
+);
+
+-- Historical snapshots for the backfilled ledger (safe to re-run)
+-- One snapshot every 50 match events per guild (SNAPSHOT_INTERVAL in app.py), so
+-- point-in-time queries from before the ledger went live replay a bounded tail.
+WITH stat_events AS (
+    SELECT e.id, e.guild_id, e.created_at,
+           ROW_NUMBER() OVER (PARTITION BY e.guild_id ORDER BY e.id) AS n
+    FROM ledger_events e
+    WHERE e.event_type IN ('match_recorded', 'match_voided')
+),
+cuts AS (
+    SELECT s.id, s.guild_id, s.created_at
+    FROM stat_events s
+    WHERE s.n % 50 = 0
+      AND NOT EXISTS (
+          SELECT 1 FROM ledger_snapshots ls
+          WHERE ls.guild_id = s.guild_id AND ls.last_event_id = s.id
+      )
+),
+deltas AS (
+    SELECT e.guild_id, e.id,
+           (p->>'user_id')::BIGINT AS user_id,
+           CASE WHEN e.event_type = 'match_recorded' THEN 1 ELSE -1 END AS sign,
+           CASE WHEN (p->>'team') = (e.payload->>'winning_team') THEN 1 ELSE 0 END AS won
+    FROM ledger_events e
+    CROSS JOIN LATERAL jsonb_array_elements(e.payload->'participants') p
+    WHERE e.event_type IN ('match_recorded', 'match_voided')
+)
+INSERT INTO ledger_snapshots (guild_id, last_event_id, event_time, stats)
+SELECT c.guild_id, c.id, c.created_at,
+       COALESCE((
+           SELECT jsonb_object_agg(t.user_id::TEXT, jsonb_build_array(t.wins, t.total_games))
+           FROM (
+               SELECT d.user_id, SUM(d.sign * d.won) AS wins, SUM(d.sign) AS total_games
+               FROM deltas d
+               WHERE d.guild_id = c.guild_id AND d.id <= c.id
+               GROUP BY d.user_id
+           ) t
+       ), '{}'::jsonb)
+FROM cuts c;
+
+-- Player summaries computed from match history
+-- Fold each player's non-voided history the same way fold_summary in player_summary.py does.
+-- Used once for the backfill below, by the admin rebuild, and (streak fields only) on void.
+-- p_user_ids = NULL means every player of the guild.
+CREATE OR REPLACE FUNCTION player_history(p_guild_id BIGINT, p_user_ids BIGINT[] DEFAULT NULL)
+RETURNS TABLE (user_id BIGINT, match_id INT, team TEXT, map_name TEXT, won INT, n BIGINT, games BIGINT, run BIGINT) AS $$
+    SELECT mp.user_id, mp.match_id, mp.team,
+           COALESCE(m.map_name, '알 수 없음'),
+           (mp.team = m.winning_team)::int,
+           ROW_NUMBER() OVER w,
+           COUNT(*) OVER (PARTITION BY mp.user_id),
+           -- Gaps and islands: consecutive results of the same kind share one run number
+           ROW_NUMBER() OVER w - ROW_NUMBER() OVER (
+               PARTITION BY mp.user_id, mp.team = m.winning_team ORDER BY mp.match_id
+           )
+    FROM match_participants mp
+    JOIN matches m ON m.id = mp.match_id
+    WHERE mp.guild_id = p_guild_id
+      AND (p_user_ids IS NULL OR mp.user_id = ANY(p_user_ids))
+      AND m.voided_at IS NULL
+    WINDOW w AS (PARTITION BY mp.user_id ORDER BY mp.match_id);
+$$ LANGUAGE sql STABLE;
+
+-- Streak fields only (current / best streak, last 20 results): what a void can't subtract
+CREATE OR REPLACE FUNCTION player_streaks(p_guild_id BIGINT, p_user_ids BIGINT[] DEFAULT NULL)
+RETURNS TABLE (user_id BIGINT, current_streak INT, best_win_streak INT, recent_results JSONB, last_match_id INT) AS $$
+    WITH history AS (
+        SELECT * FROM player_history(p_guild_id, p_user_ids)
+    ),
+    runs AS (
+        SELECT user_id, won, COUNT(*) AS len, MAX(n) = MAX(games) AS is_current
+        FROM history
+        GROUP BY user_id, won, run
+    ),
+    streaks AS (
+        SELECT user_id,
+               MAX(CASE WHEN is_current THEN (CASE WHEN won = 1 THEN len ELSE -len END) END) AS current_streak,
+               COALESCE(MAX(len) FILTER (WHERE won = 1), 0) AS best_win_streak
+        FROM runs
+        GROUP BY user_id
+    ),
+    recent AS (
+        SELECT user_id, MAX(match_id) AS last_match_id,
+               jsonb_agg(jsonb_build_array(match_id, won) ORDER BY match_id) FILTER (WHERE n > games - 20) AS recent_results
+        FROM history
+        GROUP BY user_id
+    )
+    SELECT s.user_id, s.current_streak::INT, s.best_win_streak::INT, r.recent_results, r.last_match_id
+    FROM streaks s
+    JOIN recent r USING (user_id);
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION player_summary_rows(p_guild_id BIGINT, p_user_ids BIGINT[] DEFAULT NULL)
+RETURNS TABLE (guild_id BIGINT, user_id BIGINT, wins INT, total_games INT, current_streak INT, best_win_streak INT,
+               recent_results JSONB, map_stats JSONB, teammates JSONB, opponents JSONB, last_match_id INT) AS $$
+    WITH history AS (
+        SELECT * FROM player_history(p_guild_id, p_user_ids)
+    ),
+    totals AS (
+        SELECT user_id, SUM(won) AS wins, COUNT(*) AS total_games
+        FROM history
+        GROUP BY user_id
+    ),
+    maps AS (
+        SELECT user_id, jsonb_object_agg(map_name, jsonb_build_array(wins, games)) AS map_stats
+        FROM (
+            SELECT user_id, map_name, SUM(won) AS wins, COUNT(*) AS games
+            FROM history GROUP BY user_id, map_name
+        ) t
+        GROUP BY user_id
+    ),
+    others AS (
+        SELECT user_id,
+               jsonb_object_agg(other_id::text, jsonb_build_array(wins, games)) FILTER (WHERE same_team) AS teammates,
+               jsonb_object_agg(other_id::text, jsonb_build_array(wins, games)) FILTER (WHERE NOT same_team) AS opponents
+        FROM (
+            SELECT h.user_id, o.user_id AS other_id, o.team = h.team AS same_team,
+                   SUM(h.won) AS wins, COUNT(*) AS games
+            FROM history h
+            JOIN match_participants o ON o.guild_id = p_guild_id AND o.match_id = h.match_id AND o.user_id <> h.user_id
+            GROUP BY h.user_id, o.user_id, o.team = h.team
+        ) t
+        GROUP BY user_id
+    )
+    SELECT p_guild_id, t.user_id, t.wins::INT, t.total_games::INT, s.current_streak, s.best_win_streak,
+           s.recent_results, m.map_stats,
+           COALESCE(o.teammates, '{}'::jsonb), COALESCE(o.opponents, '{}'::jsonb), s.last_match_id
+    FROM totals t
+    JOIN player_streaks(p_guild_id, p_user_ids) s USING (user_id)
+    JOIN maps m USING (user_id)
+    LEFT JOIN others o USING (user_id);
+$$ LANGUAGE sql STABLE;
+
+-- Player summary backfill (safe to re-run: only players without a summary)
+INSERT INTO player_summaries (guild_id, user_id, wins, total_games, current_streak, best_win_streak,
+                              recent_results, map_stats, teammates, opponents, last_match_id)
+SELECT r.*
+FROM (SELECT DISTINCT guild_id FROM users) g
+CROSS JOIN LATERAL player_summary_rows(g.guild_id) r
+WHERE NOT EXISTS (
+    SELECT 1 FROM player_summaries s WHERE s.guild_id = r.guild_id AND s.user_id = r.user_id
+);
+
+-- Admin repair: replaces every summary of a guild with one recomputed from its match history
+CREATE OR REPLACE FUNCTION rebuild_player_summaries(p_guild_id BIGINT)
+RETURNS INT AS $$
+    DELETE FROM player_summaries WHERE guild_id = p_guild_id;
+    INSERT INTO player_summaries (guild_id, user_id, wins, total_games, current_streak, best_win_streak,
+                                  recent_results, map_stats, teammates, opponents, last_match_id)
+    SELECT * FROM player_summary_rows(p_guild_id);
+    SELECT COUNT(*)::INT FROM player_summaries WHERE guild_id = p_guild_id;
+$$ LANGUAGE sql;
+
+-- Atomic stat increments, called by record_match / delete_match
+-- Adds per-player (wins, total_games) deltas to users and to the match's daily and season
+-- rollups in one statement (INSERT ... ON CONFLICT DO UPDATE), so concurrent matches never
+-- lose an increment. Returns the players whose counts went negative (projection drift).
+CREATE OR REPLACE FUNCTION apply_stat_deltas(p_guild_id BIGINT, p_day DATE, p_season_id INT, p_deltas JSONB)
+RETURNS TABLE (user_id BIGINT) AS $$
+    WITH d AS (
+        SELECT (x->>'user_id')::BIGINT AS user_id, (x->>'wins')::INT AS wins, (x->>'total_games')::INT AS total_games
+        FROM jsonb_array_elements(p_deltas) x
+    ),
+    lifetime AS (
+        -- Only existing members are updated (unknown ids must not create empty members)
+        UPDATE users t
+        SET wins = COALESCE(t.wins, 0) + d.wins, total_games = COALESCE(t.total_games, 0) + d.total_games
+        FROM d
+        WHERE t.guild_id = p_guild_id AND t.id = d.user_id
+        RETURNING t.id AS user_id, t.wins, t.total_games
+    ),
+    daily AS (
+        INSERT INTO user_daily_stats AS t (guild_id, day, user_id, wins, total_games)
+        SELECT p_guild_id, p_day, d.user_id, d.wins, d.total_games FROM d
+        ON CONFLICT (guild_id, day, user_id) DO UPDATE
+        SET wins = t.wins + EXCLUDED.wins, total_games = t.total_games + EXCLUDED.total_games
+        RETURNING t.user_id, t.wins, t.total_games
+    ),
+    season AS (
+        INSERT INTO user_season_stats AS t (guild_id, season_id, user_id, wins, total_games)
+        SELECT p_guild_id, p_season_id, d.user_id, d.wins, d.total_games FROM d
+        WHERE p_season_id IS NOT NULL
+        ON CONFLICT (guild_id, season_id, user_id) DO UPDATE
+        SET wins = t.wins + EXCLUDED.wins, total_games = t.total_games + EXCLUDED.total_games
+        RETURNING t.user_id, t.wins, t.total_games
+    )
+    SELECT user_id FROM lifetime WHERE wins < 0 OR total_games < 0 OR wins > total_games
+    UNION
+    SELECT user_id FROM daily WHERE wins < 0 OR total_games < 0 OR wins > total_games
+    UNION
+    SELECT user_id FROM season WHERE wins < 0 OR total_games < 0 OR wins > total_games;
+$$ LANGUAGE sql;
+
+-- Transactional record / void, called by record_match / delete_match
+-- The match row, its participants and its ledger event are written together, so a failure
+-- can never leave a match in the history that the ledger doesn't know about.
+CREATE OR REPLACE FUNCTION record_match(p_guild_id BIGINT, p_winning_team TEXT, p_map_name TEXT,
+                                        p_attack_team TEXT, p_season_id INT, p_participants JSONB)
+RETURNS SETOF matches AS $$
+DECLARE
+    m matches;
+BEGIN
+    INSERT INTO matches (guild_id, winning_team, map_name, attack_team, season_id)
+    VALUES (p_guild_id, p_winning_team, p_map_name, p_attack_team, p_season_id)
+    RETURNING * INTO m;
+
+    INSERT INTO match_participants (guild_id, match_id, user_id, team)
+    SELECT p_guild_id, m.id, (x->>'user_id')::BIGINT, x->>'team'
+    FROM jsonb_array_elements(p_participants) x;
+
+    INSERT INTO ledger_events (guild_id, event_type, match_id, payload)
+    VALUES (p_guild_id, 'match_recorded', m.id, jsonb_build_object(
+        'winning_team', p_winning_team,
+        'map_name', p_map_name,
+        'attack_team', p_attack_team,
+        'season_id', p_season_id,
+        'match_created_at', m.created_at,
+        'participants', p_participants
+    ));
+
+    RETURN NEXT m;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Marks a match voided and appends its compensating 'match_voided' event (a copy of the
+-- 'match_recorded' payload, if there is one). Returns false if the match doesn't exist or
+-- was already voided; the row lock taken by the UPDATE serializes concurrent voids.
+CREATE OR REPLACE FUNCTION void_match(p_guild_id BIGINT, p_match_id INT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    UPDATE matches SET voided_at = timezone('utc'::text, now())
+    WHERE guild_id = p_guild_id AND id = p_match_id AND voided_at IS NULL;
+    IF NOT FOUND THEN
+        RETURN false;
+    END IF;
+
+    INSERT INTO ledger_events (guild_id, event_type, match_id, payload)
+    SELECT p_guild_id, 'match_voided', e.match_id, e.payload
+    FROM ledger_events e
+    WHERE e.guild_id = p_guild_id AND e.match_id = p_match_id AND e.event_type = 'match_recorded'
+    ORDER BY e.id
+    LIMIT 1;
+    RETURN true;
+END;
+$$ LANGUAGE plpgsql;
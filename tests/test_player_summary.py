@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+from player_summary import (
+    SUMMARY_RECENT, STREAK_FIELDS, apply_streaks, empty_summary, fold_summary, is_folded, is_in_order, unfold_summary
+)
+
+
+def make_history(results, seed=0):
+    """[(match_id, map_name, won, teammates, opponents)] from a string like "WWLW"."""
+    rng = random.Random(seed)
+    return [
+        (match_id, rng.choice(["어센트", "바인드", None]), r == "W", rng.sample(range(10, 15), 2), rng.sample(range(20, 25), 3))
+        for match_id, r in enumerate(results, start=1)
+    ]
+
+
+def fold_all(history):
+    summary = empty_summary(1, 5)
+    for match in history:
+        fold_summary(summary, *match)
+    return summary
+
+
+def streaks_of(history):
+    """The STREAK_FIELDS of a history, computed from scratch (what the player_streaks RPC returns)."""
+    if not history:
+        return None
+    best = run = 0
+    for _, _, won, _, _ in history:
+        step = 1 if won else -1
+        run = run + step if run and (run > 0) == won else step
+        best = max(best, run)
+    return {
+        "current_streak": run,
+        "best_win_streak": best,
+        "recent_results": [[m[0], 1 if m[2] else 0] for m in history][-SUMMARY_RECENT:],
+        "last_match_id": history[-1][0],
+    }
+
+
+def test_fold_tracks_counts_and_streaks():
+    summary = fold_all(make_history("WWLWWWL"))
+
+    assert summary['wins'] == 5
+    assert summary['total_games'] == 7
+    assert summary['current_streak'] == -1
+    assert summary['best_win_streak'] == 3
+    assert summary['last_match_id'] == 7
+    assert [r for _, r in summary['recent_results']] == [1, 1, 0, 1, 1, 1, 0]
+    assert sum(games for _, games in summary['map_stats'].values()) == 7
+    assert all(isinstance(key, str) for key in summary['teammates'])
+
+
+def test_recent_results_keep_only_the_window():
+    summary = fold_all(make_history("W" * (SUMMARY_RECENT + 5)))
+
+    assert len(summary['recent_results']) == SUMMARY_RECENT
+    assert summary['recent_results'][0][0] == 6
+
+
+def test_voiding_the_loss_between_two_runs_merges_them():
+    history = make_history("WWLWWL")
+    summary = fold_all(history)
+    voided = history[2]
+    remaining = history[:2] + history[3:]
+
+    unfold_summary(summary, *voided)
+    apply_streaks(summary, streaks_of(remaining))
+
+    assert summary['best_win_streak'] == 4
+    assert summary == fold_all(remaining)
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_unfold_matches_a_rebuild_without_the_match(seed):
+    rng = random.Random(seed)
+    history = make_history("".join(rng.choice("WWL") for _ in range(rng.randint(1, 60))), seed)
+    summary = fold_all(history)
+    voided = rng.choice(history)
+    remaining = [m for m in history if m is not voided]
+
+    unfold_summary(summary, *voided)
+    apply_streaks(summary, streaks_of(remaining))
+
+    assert summary == fold_all(remaining)
+
+
+def test_unfold_removes_records_that_reach_zero_games():
+    history = make_history("W")
+    summary = fold_all(history)
+
+    unfold_summary(summary, *history[0])
+    apply_streaks(summary, None)
+
+    assert summary == empty_summary(1, 5)
+
+
+def test_out_of_order_fold_keeps_counts_and_defers_streaks():
+    history = make_history("WLWWLW")
+    in_order = fold_all(history)
+
+    summary = fold_all(history[:-2] + history[-1:])
+    assert not is_in_order(summary, history[-2][0])
+    before = {field: summary[field] for field in STREAK_FIELDS if field != "recent_results"}
+    fold_summary(summary, *history[-2])
+
+    assert {field: summary[field] for field in before} == before
+    for field in ("wins", "total_games", "map_stats", "teammates", "opponents", "recent_results"):
+        assert summary[field] == in_order[field]
+
+    apply_streaks(summary, streaks_of(history))
+    assert summary == in_order
+
+
+def test_is_folded():
+    history = make_history("WL")
+    summary = fold_all(history)
+
+    assert is_folded(summary, 1)
+    assert is_folded(summary, 2)
+    assert not is_folded(summary, 3)
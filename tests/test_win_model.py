@@ -0,0 +1,112 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from win_model import WinModel, calibration_report
+
+
+def make_match(match_id, team_a, team_b, winning_team, map_name="어센트", attack_team=None):
+    return {
+        "id": match_id,
+        "winning_team": winning_team,
+        "map_name": map_name,
+        "attack_team": attack_team,
+        "match_participants": (
+            [{"user_id": uid, "team": "A"} for uid in team_a]
+            + [{"user_id": uid, "team": "B"} for uid in team_b]
+        ),
+    }
+
+
+def synthetic_history(n_matches=120, n_players=12, seed=0):
+    """Random 5v5 matches where a hidden skill decides the winner."""
+    rng = random.Random(seed)
+    skill = {uid: rng.gauss(0, 1) for uid in range(n_players)}
+    tier_of = {uid: max(1, min(10, round(5 + 2 * skill[uid]))) for uid in range(n_players)}
+    matches = []
+    for match_id in range(1, n_matches + 1):
+        players = rng.sample(range(n_players), 10)
+        team_a, team_b = players[:5], players[5:]
+        diff = sum(skill[u] for u in team_a) - sum(skill[u] for u in team_b)
+        winner = "A" if rng.random() < 1 / (1 + math.exp(-diff)) else "B"
+        matches.append(make_match(
+            match_id, team_a, team_b, winner,
+            map_name=rng.choice(["어센트", "바인드"]),
+            attack_team=rng.choice(["A", "B", None]),
+        ))
+    return matches, tier_of
+
+
+@pytest.mark.parametrize("attack_team, swapped_attack", [(None, None), ("A", "B"), ("B", "A")])
+def test_predict_is_symmetric_in_team_labels(attack_team, swapped_attack):
+    matches, tier_of = synthetic_history()
+    model = WinModel.train(matches, tier_of)
+
+    team_a, team_b = [0, 1, 2, 3, 4], [5, 6, 7, 8]
+    p_ab = model.predict(team_a, team_b, "어센트", attack_team, tier_of)
+    p_ba = model.predict(team_b, team_a, "어센트", swapped_attack, tier_of)
+
+    assert p_ab + p_ba == pytest.approx(1.0)
+
+
+def test_predict_with_empty_team_is_even():
+    model = WinModel()
+    assert model.predict([], [1, 2], "어센트", None, {}) == 0.5
+
+
+def test_add_match_skips_already_trained_ids():
+    matches, tier_of = synthetic_history(n_matches=30)
+    model = WinModel.train(matches, tier_of)
+    weights, n_samples = model.weights.copy(), len(model.y)
+
+    # Same id as the last trained match (and an older one): must not be learned twice
+    model.add_match(30, [0, 1], [2, 3], "A", "어센트", None, tier_of)
+    model.add_match(5, [0, 1], [2, 3], "A", "어센트", None, tier_of)
+
+    assert len(model.y) == n_samples
+    np.testing.assert_array_equal(model.weights, weights)
+
+    model.add_match(31, [0, 1], [2, 3], "A", "어센트", None, tier_of)
+    assert len(model.y) == n_samples + 1
+    assert model.last_match_id == 31
+
+
+def test_calibration_report_on_empty_history():
+    report = calibration_report([], {})
+
+    assert report["train_matches"] == 0
+    assert report["test_matches"] == 0
+    assert report["bins"] == []
+    assert "brier" not in report
+
+
+def test_calibration_report_ignores_one_sided_matches():
+    # Matches with an empty team carry no signal and are neither trained nor scored
+    matches = [make_match(i, [1, 2], [], "A") for i in range(1, 11)]
+    report = calibration_report(matches, {1: 5, 2: 5})
+
+    assert report["train_matches"] == 0
+    assert report["test_matches"] == 0
+    assert "brier" not in report
+
+
+def test_calibration_report_when_one_team_always_wins():
+    matches = [make_match(i, [1, 2], [3, 4], "A") for i in range(1, 21)]
+    report = calibration_report(matches, {1: 5, 2: 5, 3: 5, 4: 5})
+
+    assert report["test_matches"] == 4
+    assert 0.0 <= report["brier"] <= 1.0
+    assert math.isfinite(report["log_loss"])
+    assert sum(b["count"] for b in report["bins"]) == 4
+
+
+def test_calibration_report_train_test_split():
+    matches, tier_of = synthetic_history(n_matches=50)
+    report = calibration_report(matches, tier_of, holdout=0.2)
+
+    assert report["train_matches"] == 40
+    assert report["test_matches"] == 10
+    assert sum(b["count"] for b in report["bins"]) == 10
+    assert 0.0 <= report["accuracy"] <= 1.0
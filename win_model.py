@@ -0,0 +1,209 @@
+"""Win-probability model for proposed team splits.
+
+Logistic regression on A-minus-B team feature differences (tier, rating,
+map rating, side, synergy, size). Each historical match is featurized from
+the stats known *before* it was played, then the weights are fit with a
+vectorized Newton pass over the whole history. Pure numpy, no Streamlit.
+"""
+import math
+import threading
+from itertools import combinations
+
+import numpy as np
+
+FEATURES = ["tier", "rating", "map_rating", "side", "synergy", "size"]
+PRIOR_GAMES = 4 # pseudo-games pulling sparse records toward 50%
+L2 = 1.0
+NEWTON_STEPS = 10
+INCREMENTAL_STEPS = 2
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _smoothed(record):
+    """Win rate shrunk toward 50%, centred on 0."""
+    wins, games = record
+    return (wins + PRIOR_GAMES / 2) / (games + PRIOR_GAMES) - 0.5
+
+
+def _bump(table, key, won):
+    wins, games = table.get(key, (0, 0))
+    table[key] = (wins + won, games + 1)
+
+
+def split_teams(match):
+    """Returns (team_a_ids, team_b_ids) from a match row with embedded match_participants."""
+    team_a, team_b = [], []
+    for p in match.get('match_participants') or []:
+        (team_a if p['team'] == 'A' else team_b).append(p['user_id'])
+    return team_a, team_b
+
+
+class ScrimStats:
+    """Running (wins, games) records per player, per player-map and per teammate pair."""
+
+    def __init__(self):
+        self.player = {}
+        self.player_map = {}
+        self.pair = {}
+
+    def team_features(self, team_ids, map_name, tier_of):
+        tier = np.mean([tier_of.get(uid, 0) for uid in team_ids]) / 10
+        rating = np.mean([_smoothed(self.player.get(uid, (0, 0))) for uid in team_ids])
+        map_rating = np.mean([_smoothed(self.player_map.get((uid, map_name), (0, 0))) for uid in team_ids])
+        pairs = list(combinations(sorted(team_ids), 2))
+        synergy = np.mean([_smoothed(self.pair.get(p, (0, 0))) for p in pairs]) if pairs else 0.0
+        return np.array([tier, rating, map_rating, synergy])
+
+    def features(self, team_a, team_b, map_name, attack_team, tier_of):
+        tier, rating, map_rating, synergy = (
+            self.team_features(team_a, map_name, tier_of) - self.team_features(team_b, map_name, tier_of)
+        )
+        side = {"A": 1.0, "B": -1.0}.get(attack_team, 0.0)
+        size = (len(team_a) - len(team_b)) / 5
+        return np.array([tier, rating, map_rating, side, synergy, size])
+
+    def update(self, team_a, team_b, winning_team, map_name):
+        for team_ids, team in ((team_a, "A"), (team_b, "B")):
+            won = 1 if team == winning_team else 0
+            for uid in team_ids:
+                _bump(self.player, uid, won)
+                _bump(self.player_map, (uid, map_name), won)
+            for pair in combinations(sorted(team_ids), 2):
+                _bump(self.pair, pair, won)
+
+
+class WinModel:
+    """Predicts P(team A wins). Safe to share between sessions."""
+
+    def __init__(self):
+        self.stats = ScrimStats()
+        self.weights = np.zeros(len(FEATURES))
+        self.X = np.empty((0, len(FEATURES)))
+        self.y = np.empty(0)
+        self.last_match_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def train(cls, matches, tier_of):
+        """Fits a model on `matches` (oldest first). tier_of maps user_id -> tier priority."""
+        model = cls()
+        rows, labels = [], []
+        for m in matches:
+            team_a, team_b = split_teams(m)
+            if team_a and team_b:
+                rows.append(model.stats.features(team_a, team_b, m.get('map_name'), m.get('attack_team'), tier_of))
+                labels.append(1.0 if m['winning_team'] == 'A' else 0.0)
+                model.stats.update(team_a, team_b, m['winning_team'], m.get('map_name'))
+            model.last_match_id = max(model.last_match_id, m['id'])
+        if rows:
+            model.X = np.array(rows)
+            model.y = np.array(labels)
+        model._fit(NEWTON_STEPS)
+        return model
+
+    def _fit(self, steps):
+        # Every match is also added mirrored (B vs A: features negated, label flipped), so the
+        # model is symmetric in team labels and needs no intercept.
+        X = np.vstack([self.X, -self.X])
+        y = np.concatenate([self.y, 1 - self.y])
+        if not len(y):
+            return
+        w = self.weights
+        ridge = L2 * np.eye(len(w))
+        for _ in range(steps):
+            p = _sigmoid(X @ w)
+            grad = X.T @ (p - y) + L2 * w
+            hess = (X * (p * (1 - p))[:, None]).T @ X + ridge
+            w = w - np.linalg.solve(hess, grad)
+        self.weights = w
+
+    def predict(self, team_a, team_b, map_name, attack_team, tier_of):
+        """Probability that team_a beats team_b."""
+        if not team_a or not team_b:
+            return 0.5
+        x = self.stats.features(team_a, team_b, map_name, attack_team, tier_of)
+        return float(_sigmoid(x @ self.weights))
+
+    def add_match(self, match_id, team_a, team_b, winning_team, map_name, attack_team, tier_of):
+        """Learns one new match: appends its sample and warm-starts a few Newton steps."""
+        with self._lock:
+            if match_id <= self.last_match_id:
+                return # already part of the training history
+            if team_a and team_b:
+                x = self.stats.features(team_a, team_b, map_name, attack_team, tier_of)
+                self.X = np.vstack([self.X, x])
+                self.y = np.append(self.y, 1.0 if winning_team == 'A' else 0.0)
+                self.stats.update(team_a, team_b, winning_team, map_name)
+                self._fit(INCREMENTAL_STEPS)
+            self.last_match_id = match_id
+
+
+def calibration_report(matches, tier_of, holdout=0.2, n_bins=10):
+    """Trains on the oldest matches, then walks forward over the newest `holdout`
+    fraction: predict each match, score it, learn it. Returns a dict of metrics."""
+    split = int(len(matches) * (1 - holdout))
+    model = WinModel.train(matches[:split], tier_of)
+
+    probs, outcomes = [], []
+    for m in matches[split:]:
+        team_a, team_b = split_teams(m)
+        if team_a and team_b:
+            probs.append(model.predict(team_a, team_b, m.get('map_name'), m.get('attack_team'), tier_of))
+            outcomes.append(1.0 if m['winning_team'] == 'A' else 0.0)
+        model.add_match(m['id'], team_a, team_b, m['winning_team'], m.get('map_name'), m.get('attack_team'), tier_of)
+
+    report = {
+        "train_matches": len(model.y) - len(outcomes),
+        "test_matches": len(outcomes),
+        "weights": dict(zip(FEATURES, model.weights.round(3).tolist())),
+        "bins": [],
+    }
+    if not outcomes:
+        return report
+
+    p = np.clip(np.array(probs), 1e-6, 1 - 1e-6)
+    y = np.array(outcomes)
+    report["brier"] = float(np.mean((p - y) ** 2))
+    report["log_loss"] = float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+    report["accuracy"] = float(np.mean((p > 0.5) == (y == 1)))
+
+    # Reliability diagram: mean predicted vs observed A-win rate per probability bin
+    bin_idx = np.minimum((p * n_bins).astype(int), n_bins - 1)
+    ece = 0.0
+    for b in range(n_bins):
+        mask = bin_idx == b
+        if not mask.any():
+            continue
+        mean_pred = float(p[mask].mean())
+        observed = float(y[mask].mean())
+        ece += mask.sum() / len(p) * abs(mean_pred - observed)
+        report["bins"].append({
+            "range": f"{b / n_bins:.1f}-{(b + 1) / n_bins:.1f}",
+            "count": int(mask.sum()),
+            "predicted": mean_pred,
+            "observed": observed,
+        })
+    report["ece"] = float(ece)
+    return report
+
+
+def format_report(report):
+    """Renders a calibration report as markdown."""
+    lines = [f"- 학습 매치: {report['train_matches']} / 평가 매치: {report['test_matches']}"]
+    if "brier" in report:
+        lines += [
+            f"- Brier score: {report['brier']:.4f} (기준선 0.2500)",
+            f"- Log loss: {report['log_loss']:.4f} (기준선 {math.log(2):.4f})",
+            f"- 정확도: {report['accuracy'] * 100:.1f}%",
+            f"- ECE (Expected Calibration Error): {report['ece']:.4f}",
+            "",
+            "| 예측 구간 | 매치 수 | 평균 예측 | 실제 A팀 승률 |",
+            "|---|---|---|---|",
+        ]
+        for b in report["bins"]:
+            lines.append(f"| {b['range']} | {b['count']} | {b['predicted'] * 100:.1f}% | {b['observed'] * 100:.1f}% |")
+    lines += ["", "가중치: " + ", ".join(f"{k}={v}" for k, v in report["weights"].items())]
+    return "\n".join(lines)